@@ -7,6 +7,13 @@ from .Path import *
 from .async import *
 from .zscroll import *
 from .aggregators import *
+from .columnar import *
+from .lazyrows import *
+from .lazytsv import *
+from .parallel import *
+from .groups import *
+from .sketches import *
+from .virtualrows import *
 from .data import *
 from .clipboard import *
 
@@ -18,6 +25,7 @@ from .pivot import *
 from .tidydata import *
 from .cmdlog import *
 from .freeze import *
+from .extsort import *
 from .regex import *
 from .canvas import *
 from .graph import *
@@ -32,4 +40,6 @@ from .loaders.postgres import *
 from .loaders.shp import *
 from .loaders.mbtiles import *
 
+from .follow import *
+
 addGlobals(globals())
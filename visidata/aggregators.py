@@ -1,43 +1,163 @@
 import collections
+
 from visidata import *
 globalCommand('+', 'addAggregator([cursorCol], chooseOne(aggregators))', 'add aggregator to the current column')
 globalCommand('z+', 'status(chooseOne(aggregators)(cursorCol, selectedRows or rows))', 'display result of aggregator over values in selected rows for current column')
 
 aggregators = collections.OrderedDict()
 
+
+class Aggregator:
+    '''Aggregator `name` as a mergeable accumulator over the valid values (and their rows) of a column:
+       init() -> state; update(state, value, row) -> state; merge(state, state) -> state; finalize(state, col) -> result.
+       Calling it as aggr(col, rows) aggregates one column on its own.'''
+    fused = True       # evaluated together with the other fused aggregators of a column, in one pass over the values
+
+    def __init__(self, name, type=None, init=None, update=None, merge=None, finalize=None):
+        self.__name__ = name
+        self.type = type
+        if init: self.init = init
+        if update: self.update = update
+        if merge: self.merge = merge
+        if finalize: self.finalize = finalize
+
+    def __call__(self, col, rows):
+        ret = aggregateValues(col, [self], rows)[0]
+        if isinstance(ret, Exception):
+            raise ret
+        return ret
+
+
+class ListAggregator(Aggregator):
+    'Aggregator that collects all the values and calls func(values) at the end.'
+    def __init__(self, name, func, type=None):
+        super().__init__(name, type)
+        self.func = func
+
+    def init(self):
+        return []
+
+    def update(self, state, v, row):
+        state.append(v)
+        return state
+
+    def merge(self, a, b):
+        return a + b
+
+    def finalize(self, state, col):
+        return self.func(state)
+
+
+class FullAggregator(Aggregator):
+    'Aggregator that calls func(col, rows) on its own, with all the rows including errors and nulls.'
+    fused = False
+
+    def __init__(self, name, type, func):
+        super().__init__(name, type)
+        self.func = func
+
+    def __call__(self, col, rows):
+        return self.func(col, rows)
+
+
 def aggregator(name, func, type=None):
     'Define simple aggregator `name` that calls func(values)'
-    def _func(col, rows):  # wrap builtins so they can have a .type
-        return func(col.getValues(rows))
-    _func.type = type
-    _func.__name__ = name
-    aggregators[name] = _func
+    aggregators[name] = ListAggregator(name, func, type)
 
 def fullAggregator(name, type, func):
     'Define aggregator `name` that calls func(col, rows)'
-    func.type=type
-    func.__name__ = name
-    aggregators[name] = func
+    aggregators[name] = FullAggregator(name, type, func)
+
+def accumulator(name, type, init, update, merge, finalize=lambda state, col: state):
+    'Define aggregator `name` as a mergeable accumulator of values only.'
+    aggregators[name] = Aggregator(name, type, init, update, merge, finalize)
+
+
+def updateStates(aggrs, states, v, r):
+    'Update list of `states` of fused `aggrs` with value `v` of row `r`.  A state which fails is replaced by its exception, and not updated again.'
+    for j, a in enumerate(aggrs):
+        s = states[j]
+        if not isinstance(s, Exception):
+            try:
+                states[j] = a.update(s, v, r)
+            except Exception as e:
+                states[j] = e
+
+def mergeStates(aggrs, states, others):
+    'Return list of states of fused `aggrs` merged from two lists of states, either of which may have exceptions.'
+    return [s if isinstance(s, Exception) else t if isinstance(t, Exception) else _tryCall(a.merge, s, t)
+                for a, s, t in zip(aggrs, states, others)]
+
+def finalizeStates(col, aggrs, states):
+    'Return list of results (or exceptions) of fused `aggrs` from their `states` over `col`.'
+    return [s if isinstance(s, Exception) else _tryCall(a.finalize, s, col) for a, s in zip(aggrs, states)]
+
+def partialStates(col, aggrs, rows):
+    'Return list of final states (or exceptions) of fused `aggrs` over the valid values of `col` in `rows`, in one pass.'
+    states = [a.init() for a in aggrs]
+    for v, r in col.getValueRows(rows):
+        updateStates(aggrs, states, v, r)
+    return states
+
+def _tryCall(func, *args):
+    try:
+        return func(*args)
+    except Exception as e:
+        return e
+
+def aggregateValues(col, aggrs, rows):
+    'Return list of results (or exceptions) of each of `aggrs` over `col` for `rows`, evaluating the fused ones together.'
+    rows = list(rows)
+    fused = [a for a in aggrs if a.fused]
+    results = {}
+    if fused:
+        results.update(zip(fused, finalizeStates(col, fused, partialStates(col, fused, rows))))
+
+    for a in aggrs:
+        if not a.fused:
+            results[a] = _tryCall(a, col, rows)
+    return [results[a] for a in aggrs]
+
 
 def mean(vals):
     vals = list(vals)
     if vals:
         return float(sum(vals))/len(vals)
 
+def _min(a, b):
+    return b if a is None or (b is not None and b < a) else a
+
+def _max(a, b):
+    return b if a is None or (b is not None and b > a) else a
+
+def _empty(func):
+    'Return finalizer which raises like func([]) if no values were aggregated.'
+    def _finalize(state, col):
+        return func([]) if state is None else state
+    return _finalize
+
+def _mean(state, col):
+    total, n = state
+    if n:
+        return float(total)/n
 
-aggregator('min', min)
-aggregator('max', max)
-aggregator('avg', mean, float)
-aggregator('mean', mean, float)
-aggregator('sum', sum)
-aggregator('distinct', lambda values: len(set(values)), int)
-aggregator('count', lambda values: sum(1 for v in values), int)
+accumulator('min', None, lambda: None, lambda s, v, r: _min(s, v), _min, _empty(min))
+accumulator('max', None, lambda: None, lambda s, v, r: _max(s, v), _max, _empty(max))
+accumulator('avg', float, lambda: (0, 0), lambda s, v, r: (s[0]+v, s[1]+1), lambda a, b: (a[0]+b[0], a[1]+b[1]), _mean)
+accumulator('mean', float, lambda: (0, 0), lambda s, v, r: (s[0]+v, s[1]+1), lambda a, b: (a[0]+b[0], a[1]+b[1]), _mean)
+accumulator('sum', None, lambda: 0, lambda s, v, r: s+v, operator.add)
+accumulator('distinct', int, set, lambda s, v, r: s.add(v) or s, lambda a, b: a | b, lambda s, col: len(s))
+accumulator('count', int, lambda: 0, lambda s, v, r: s+1, operator.add)
 
 def rowkeys(sheet, row):
     return ' '.join(c.getDisplayValue(row) for c in sheet.keyCols)
 
 # returns keys of the row with the max value
-fullAggregator('keymax', anytype, lambda col, rows: rowkeys(col.sheet, max(col.getValueRows(rows))[1]))
+aggregators['keymax'] = Aggregator('keymax', anytype,
+        init=lambda: None,
+        update=lambda s, v, r: (v, r) if s is None or v > s[0] else s,
+        merge=lambda a, b: b if a is None or (b is not None and b[0] > a[0]) else a,
+        finalize=lambda s, col: rowkeys(col.sheet, _empty(max)(s, col)[1]))
 
 ColumnsSheet.commands += [
     Command('g+', 'addAggregator(selectedRows or source.nonKeyVisibleCols, chooseOne(aggregators))', 'add aggregator to selected source columns'),
@@ -93,6 +93,7 @@ SheetsSheet.columns += [
 # each row is an augmented threading.Thread object
 class TasksSheet(Sheet):
     rowtype = 'threads'
+    cacheCells = False
     commands = [
         Command('d', 'cancelThread(cursorRow)', 'abort task at current row'),
         Command('^C', 'd'),
@@ -5,9 +5,9 @@ from visidata import *
 # vd.cliprows = [(source_sheet, source_row_idx, source_row)]
 
 globalCommand('y', 'vd.cliprows = [(sheet, cursorRowIndex, cursorRow)]', 'copy current row to clipboard')
-globalCommand('d', 'vd.cliprows = [(sheet, cursorRowIndex, rows.pop(cursorRowIndex))]', 'delete current row and move it to clipboard')
-globalCommand('p', 'rows[cursorRowIndex+1:cursorRowIndex+1] = list(deepcopy(r) for s,i,r in vd.cliprows)', 'paste clipboard rows after current row')
-globalCommand('P', 'rows[cursorRowIndex:cursorRowIndex] = list(deepcopy(r) for s,i,r in vd.cliprows)', 'paste clipboard rows after current row')
+globalCommand('d', 'vd.cliprows = [(sheet, cursorRowIndex, removeRows([cursorRowIndex])[0])]', 'delete current row and move it to clipboard')
+globalCommand('p', 'addRows(pasteRows(sheet, (r for s,i,r in vd.cliprows)), cursorRowIndex+1)', 'paste clipboard rows after current row')
+globalCommand('P', 'addRows(pasteRows(sheet, (r for s,i,r in vd.cliprows)), cursorRowIndex)', 'paste clipboard rows after current row')
 
 globalCommand('gd', 'vd.cliprows = list((None, i, r) for i, r in enumerate(selectedRows)); deleteSelected()', 'delete all selected rows and move them to clipboard')
 globalCommand('gy', 'vd.cliprows = list((None, i, r) for i, r in enumerate(selectedRows))', 'copy all selected rows to clipboard')
@@ -16,3 +16,20 @@ globalCommand('zy', 'vd.clipvalue = cursorDisplay', 'copy this cell to clipboard
 globalCommand('gzp', 'cursorCol.setValues(selectedRows or rows, vd.clipvalue)', 'set contents of current column for selected rows to last clipboard value')
 globalCommand('zp', 'cursorCol.setValue(cursorRow, vd.clipvalue)', 'set contents of current column for current row to last clipboard value')
 
+
+def pasteRows(sheet, rows):
+    '''Return list of clipboard `rows` to insert into `sheet`, sharing them copy-on-write with the other sheets which still hold them;
+       rows already on the sheet are deepcopied, as a sheet holds each row only once.'''
+    others = [vs for vs in vd().sheets if vs is not sheet and isinstance(vs.rows, list)]
+    onsheet = set(map(id, sheet.rows))
+    ret = []
+    for r in rows:
+        if id(r) in onsheet:
+            r = deepcopy(r)
+        else:
+            holders = tuple(vs for vs in others if vs.rowIndex(r) is not None)
+            if holders:
+                vd().sharedRows.share([r], sheet, *holders)
+        onsheet.add(id(r))
+        ret.append(r)
+    return ret
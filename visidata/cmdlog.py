@@ -8,6 +8,7 @@ option('replay_wait', 0.0, 'time to wait between replayed commands, in seconds')
 option('disp_replay_play', '▶', 'status indicator for active replay')
 option('disp_replay_pause', '‖', 'status indicator for paused replay')
 option('replay_movement', False, 'insert movements during replay')
+option('undo_checkpoint_interval', 0, 'number of commands between checkpoints of all sheets (copying all their rows and cells), to replay from for undo of changes which cannot be reversed (0 to replay from the start)')
 
 globalCommand('D', 'vd.push(vd.cmdlog)', 'open CommandLog')
 globalCommand('^D', 'saveSheet(vd.cmdlog, input("save to: ", "filename", value=fnSuffix("cmdlog-{0}.vd") or "cmdlog.vd"))', 'save CommandLog to new .vd file')
@@ -15,7 +16,8 @@ globalCommand('^U', 'CommandLog.togglePause()', 'pause/resume replay')
 globalCommand(' ', 'CommandLog.currentReplay.advance()', 'execute next row in replaying sheet')
 globalCommand('^K', 'CommandLog.currentReplay.cancel()', 'cancel current replay')
 
-#globalCommand('KEY_BACKSPACE', 'vd.cmdlog.undo()', 'remove last action on commandlog and replay')
+globalCommand('U', 'vd.cmdlog.undo()', 'undo the last command')
+globalCommand('gU', 'vd.cmdlog.redo()', 'redo the last undone command')
 
 
 globalCommand('status', 'status(input("status: ", display=False))', 'show given status message')
@@ -25,6 +27,7 @@ nonLogKeys = 'KEY_DOWN KEY_UP KEY_NPAGE KEY_PPAGE kDOWN kUP j k gj gk ^F ^B r <
 nonLogKeys += 'KEY_LEFT KEY_RIGHT h l gh gl c'.split()
 nonLogKeys += 'zk zj zt zz zb zh zl zKEY_LEFT zKEY_RIGHT'.split()
 nonLogKeys += '^L ^C ^U ^D KEY_RESIZE'.split()
+nonLogKeys += 'U gU'.split()
 
 
 def itemsetter(i):
@@ -72,6 +75,82 @@ def loggable(keystrokes):
         return False
     return True
 
+class Checkpoint:
+    '''State of the given sheets (except command logs) after the first `cmdidx` commands of the log.
+       Lists, columns and the cells of list rows are restored in place, so that rows keep their identity and other references to them stay valid.'''
+    def __init__(self, cmdidx, sheets):
+        self.cmdidx = cmdidx
+        self.sheets = list(sheets)
+        sheets = [vs for vs in sheets if not isinstance(vs, CommandLog)]
+        self.sheetStates = [(vs, dict(vs.__dict__), dict(vs._selection.selected)) for vs in sheets]
+        self.colLists = set(id(vs.columns) for vs in sheets)
+        self.colStates = {}  # [id(col)] -> (col, col.__dict__)
+        self.lists = {}      # [id(list)] -> (list, contents), for columns, rows and column storage vectors
+        self.cells = {}      # [id(row)] -> (row, list(row)), for rows which are lists
+        self.edits = {}      # [id(vector)] -> (vector, dict(vector.edits)), for cells kept in column storage (frozen and columnar) or by frozen columns
+        for vs in sheets:
+            self.lists[id(vs.columns)] = (vs.columns, list(vs.columns))
+            for c in vs.columns:
+                self.colStates[id(c)] = (c, dict(c.__dict__))
+                self.saveEdits(getattr(c, 'vector', None))
+                self.saveEdits(c)
+            store = getattr(vs, 'store', None)
+            if store is not None:
+                self.lists[id(store.vectors)] = (store.vectors, list(store.vectors))
+                for vec in store.vectors:
+                    self.saveEdits(vec)
+        for vs in sheets:
+            if isinstance(vs.rows, list) and id(vs.rows) not in self.lists:  # rows of columns sheets are the source columns
+                self.lists[id(vs.rows)] = (vs.rows, list(vs.rows))
+                if vs.cacheCells:  # not views of live objects
+                    for r in vs.rows:
+                        if isinstance(r, list):
+                            self.cells[id(r)] = (r, list(r))
+        self.sharedRows = dict(vd().sharedRows.holders)
+
+    def saveEdits(self, vec):
+        if hasattr(vec, 'edits'):
+            self.edits[id(vec)] = (vec, dict(vec.edits))
+
+    def restore(self):
+        'Restore the sheets to this checkpoint, which can be restored again.'
+        for L, contents in self.lists.values():
+            L[:] = contents
+
+        for r, contents in self.cells.values():
+            r[:] = contents
+
+        for vec, edits in self.edits.values():
+            vec.edits.clear()
+            vec.edits.update(edits)
+
+        vd().sharedRows.holders = dict(self.sharedRows)
+
+        for c, d in self.colStates.values():
+            c.__dict__.clear()
+            c.__dict__.update(d)
+            if c._cachedValues is not None:
+                c._cachedValues.clear()
+            c._typedVector = None
+
+        for vs, d, selected in self.sheetStates:
+            if not isinstance(d['rows'], list) and getattr(d['rows'], 'materialized', None) is not None:
+                d['rows'].materialized = None   # LazyRows changed since; get them again
+            vs.__dict__.clear()
+            vs.__dict__.update(d)
+            vs._selection = Selection(vs)
+            vs._selection.selected.update(selected)
+            vs._matchIndexes = {}
+            vs._rowPositions = {}
+            vs._cellCache = {}
+            vs._cellCacheVersion = None
+            vs.progresses = []
+            vs.currentThreads = []
+
+        vd().sheets[:] = self.sheets
+        vd().cellVersion += 1
+
+
 def open_vd(p):
     return CommandLog(p.name, source=p)
 
@@ -79,6 +158,7 @@ def open_vd(p):
 class CommandLog(Sheet):
     'Log of commands for current session.'
     rowtype = 'commands'
+    cacheCells = False
     commands = [
         Command('x', 'sheet.replayOne(cursorRow); status("replayed one row")', 'replay command in current row'),
         Command('gx', 'sheet.replay()', 'replay contents of entire CommandLog'),
@@ -91,12 +171,16 @@ class CommandLog(Sheet):
     currentReplayRow = None  # must be global, to allow replay
     semaphore = threading.Semaphore(0)
     filetype = 'vd'
+    maxCheckpoints = 4
 
     def __init__(self, name, source=None, **kwargs):
         super().__init__(name, source=source, **kwargs)
         self.currentActiveRow = None
 
         self.sheetmap = {}   # sheet.name -> vs
+        self.checkpoints = []  # Checkpoint, oldest first
+        self.undoing = False   # True while replaying the log for undo
+        self.replayIdx = None  # index of the command being replayed for undo
 
     def newRow(self):
         return CommandLogRow()
@@ -106,26 +190,113 @@ class CommandLog(Sheet):
         self.rows = [CommandLogRow(r) for r in self.rows]
 
     def undo(self):
-        'Delete last command, reload sources, and replay entire log.'
-        if len(self.rows) < 2:
-            error('no more to undo')
+        '''Undo the last command, by reversing its recorded changes if it can be,
+           or else by replaying the log up to it from the last checkpoint before it.'''
+        journal = vd().journal
+        if not journal.groups:
+            error('nothing to undo')
+        self.checkIdle()
+        self.endCommand()
+
+        group = journal.groups.pop()
+        if group:
+            journal.apply(group, undo=True)
+            if group.cmdrow is not None:
+                self.rows.pop(self.cmdIndex(group.cmdrow))
+        else:
+            self.replayWithout(self.cmdIndex(group.cmdrow))
+
+        journal.redoGroups.append(group)
+        status('undid "%s"' % (group.cmdrow.keystrokes if group.cmdrow else 'changes'))
+
+    def redo(self):
+        'Redo the last undone command, by its recorded changes if it can be, or else by executing it again.'
+        journal = vd().journal
+        if not journal.redoGroups:
+            error('nothing to redo')
+        self.checkIdle()
+        self.endCommand()
+
+        group = journal.redoGroups.pop()
+        if group:
+            journal.apply(group, undo=False)
+            if group.cmdrow is not None:
+                self.addRow(group.cmdrow)
+                group.cmdidx = len(self.rows)-1
+            journal.groups.append(group)
+        else:
+            redoGroups = list(journal.redoGroups)
+            self.replayOne(group.cmdrow)
+            sync()
+            journal.redoGroups[:] = redoGroups
 
-        deletedRow = self.rows[-2]   # the command to undo
-        del self.rows[-2:]           # delete the previous command and the undo command
+        status('redid "%s"' % (group.cmdrow.keystrokes if group.cmdrow else 'changes'))
 
-        vd().sheets = [self]
+    def endCommand(self):
+        'Finish the undo/redo command itself, which is neither logged nor recorded.'
+        self.currentActiveRow = None
+        vd().journal.end()
+
+    def checkIdle(self):
+        if any(t.is_alive() for t in vd().unfinishedThreads if t is not threading.current_thread()):
+            error('wait for async tasks to finish first')
+
+    def cmdIndex(self, cmdrow):
+        'Return index of `cmdrow` in the log, searching from the end.'
+        for i in range(len(self.rows)-1, -1, -1):
+            if self.rows[i] is cmdrow:
+                return i
+        error('command not in log')
+
+    def replayWithout(self, cmdidx):
+        'Remove command `cmdidx` from the log, restore the last checkpoint before it (or start over), and replay the commands since.'
+        del self.rows[cmdidx]
+        self.checkpoints = [cp for cp in self.checkpoints if cp.cmdidx <= cmdidx]
+        if self.checkpoints:
+            cp = self.checkpoints[-1]
+            cp.restore()
+            start = cp.cmdidx
+        else:
+            vd().sheets[:] = []
+            vd().push(self)
+            start = 0
+
+        journal = vd().journal
+        for group in journal.groups:
+            if group.cmdidx is not None and group.cmdidx >= start:
+                journal.drop(group)  # replaying will record them again
+        journal.groups = [g for g in journal.groups if g.cmdidx is None or g.cmdidx < start]
 
         self.sheetmap = {}
-        for r in self.rows:
-            self.replayOne(r)
+        self.undoing = True
+        try:
+            with Progress(total=len(self.rows)-start) as prog:
+                for i in range(start, len(self.rows)):
+                    self.replayIdx = i
+                    self.replayOne(self.rows[i])
+                    sync()
+                    prog.addProgress(1)
+        finally:
+            self.undoing = False
+
+    def checkpoint(self, ncmds):
+        'Take a checkpoint of all sheets after the first `ncmds` commands, every options.undo_checkpoint_interval commands while no async tasks are running.'
+        interval = options.undo_checkpoint_interval
+        lastidx = self.checkpoints[-1].cmdidx if self.checkpoints else 0
+        if not interval or ncmds - lastidx < interval:
+            return
+        if any(t.is_alive() for t in vd().unfinishedThreads if t is not threading.current_thread()):
+            return  # try again after the next command
 
-        status('undid "%s"' % deletedRow.keystrokes)
+        self.checkpoints.append(Checkpoint(ncmds, vd().sheets))
+        del self.checkpoints[:-self.maxCheckpoints]
 
     def beforeExecHook(self, sheet, keystrokes, args=''):
         if sheet is self:
             return  # don't record editlog commands
         if self.currentActiveRow:
             self.afterExecSheet(sheet, False, '')
+        vd().journal.begin()
         if keystrokes == 'o':
             sheetname, colname, rowname = '', '', ''
         else:
@@ -142,12 +313,21 @@ class CommandLog(Sheet):
         if err:
             self.currentActiveRow[-1] += ' [%s]' % err
 
-        if sheet is not self:  # don't record jumps to cmdlog
+        cmdrow, cmdidx = None, None
+        if self.undoing:  # replaying for undo a command which is already in the log
+            cmdrow, cmdidx = self.rows[self.replayIdx], self.replayIdx
+        elif sheet is not self:  # don't record jumps to cmdlog
             # remove user-aborted commands and simple movements
             if not escaped and loggable(self.currentActiveRow.keystrokes):
-                self.addRow(self.currentActiveRow)
+                cmdrow, cmdidx = self.currentActiveRow, len(self.rows)
+                self.addRow(cmdrow)
 
         self.currentActiveRow = None
+        journal = vd().journal
+        if journal.end(cmdrow, cmdidx) is not None and not self.undoing:
+            journal.redoGroups.clear()
+        if cmdrow:
+            self.checkpoint(cmdidx+1)
 
     def openHook(self, vs, src):
         self.addRow(CommandLogRow(['', '', '', 'o', src, 'open file']))
@@ -264,7 +444,10 @@ class CommandLog(Sheet):
                 self.cursorRowIndex += 1
                 prog.addProgress(1)
 
-                sync(1 if live else 0)  # expect this thread also if playing live
+                while not sync(1 if live else 0, timeout=1):  # expect this thread also if playing live
+                    if CommandLog.currentReplay is None:
+                        status('replay canceled')
+                        return
                 while not self.delay():
                     pass
 
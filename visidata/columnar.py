@@ -0,0 +1,192 @@
+from array import array
+
+from .vdtui import *
+
+option('columnar', False, 'store rows of tsv/csv sheets in compact per-column buffers')
+
+
+class StringVector:
+    'Append-only utf-8 arena with offsets; edited cells are kept in an overlay.'
+    def __init__(self, n=0):
+        self.arena = bytearray()
+        self.offsets = array('Q', [0]*(n+1))
+        self.edits = {}   # [rowidx] -> value set after loading
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def append(self, s):
+        self.arena += s.encode(options.encoding, options.encoding_errors)
+        self.offsets.append(len(self.arena))
+
+    def get(self, i):
+        if self.edits and i in self.edits:
+            return self.edits[i]
+        return self.arena[self.offsets[i]:self.offsets[i+1]].decode(options.encoding, options.encoding_errors)
+
+    def set(self, i, v):
+        self.edits[i] = v
+
+
+class TypedVector:
+    'array of int/float values; cells which do not round-trip exactly are kept in the overlay as the original value.'
+    typecodes = {int: 'q', float: 'd'}
+
+    def __init__(self, t):
+        self.type = t
+        self.values = array(self.typecodes[t])
+        self.edits = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, s):
+        try:
+            v = self.type(s)
+            if str(v) != s:
+                raise ValueError(s)
+            self.values.append(v)
+        except Exception:
+            self.edits[len(self.values)] = s
+            self.values.append(0)
+
+    def get(self, i):
+        if self.edits and i in self.edits:
+            return self.edits[i]
+        return self.values[i]
+
+    def set(self, i, v):
+        self.edits[i] = v
+
+
+class ColumnarRow:
+    'Lightweight handle to row `idx` of a ColumnarStore; supports row[colidx] like a list.'
+    __slots__ = ('store', 'idx')
+
+    def __init__(self, store, idx):
+        self.store = store
+        self.idx = idx
+
+    def __getitem__(self, colidx):
+        return self.store.get(self.idx, colidx)
+
+    def __setitem__(self, colidx, v):
+        self.store.set(self.idx, colidx, v)
+
+    def __len__(self):
+        return self.store.lengths[self.idx]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __deepcopy__(self, memo):
+        'a deep copy is a detached list of the current values'
+        return list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class ColumnarStore:
+    'Compact per-column storage for rows of str fields, as from the tsv and csv loaders.'
+    def __init__(self, ncols=0):
+        self.vectors = [StringVector() for i in range(ncols)]
+        self.lengths = array('I')   # number of fields in each row
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def append(self, fields):
+        'Append list of str `fields` and return handle for the new row.'
+        with self.lock:
+            n = len(self.lengths)
+            while len(self.vectors) < len(fields):
+                self.vectors.append(StringVector(n))
+            for vec, s in zip(self.vectors, fields):
+                vec.append(s)
+            for vec in self.vectors[len(fields):]:
+                vec.append('')
+            self.lengths.append(len(fields))
+            return ColumnarRow(self, n)
+
+    def get(self, rowidx, colidx):
+        if colidx >= self.lengths[rowidx]:
+            raise IndexError('row has only %s fields' % self.lengths[rowidx])
+        return self.vectors[colidx].get(rowidx)
+
+    def set(self, rowidx, colidx, v):
+        if colidx >= self.lengths[rowidx]:
+            raise IndexError('row has only %s fields' % self.lengths[rowidx])
+        with self.lock:
+            self.vectors[colidx].set(rowidx, v)
+
+    @async
+    def retype(self, colidx, t):
+        'Convert column to a typed array for int/float, or back to strings for any other type.'
+        oldvec = self.vectors[colidx]
+        if t in TypedVector.typecodes:
+            if getattr(oldvec, 'type', None) is t:
+                return
+            newvec = TypedVector(t)
+        elif isinstance(oldvec, StringVector):
+            return
+        else:
+            newvec = StringVector()
+
+        for i in Progress(range(len(oldvec))):
+            newvec.append(str(oldvec.get(i)))
+
+        if len(newvec.edits) > len(newvec)//2:  # mostly non-numeric; not worth it
+            return
+
+        with self.lock:  # catch up with rows appended and cells edited during conversion
+            for i in range(len(newvec), len(oldvec)):
+                newvec.append(str(oldvec.get(i)))
+            newvec.edits.update(oldvec.edits)
+            self.vectors[colidx] = newvec
+
+
+class ColumnarColumn(Column):
+    'Like ColumnItem, but also compacts the column in the sheet store when its type is set.'
+    def __init__(self, name, colidx, **kwargs):
+        super().__init__(name, **kwargs)
+        self.colidx = colidx
+
+    def calcValue(self, row):
+        return row[self.colidx]
+
+    def setValue(self, row, value):
+        row = self.sheet.ownRow(row)
+        self.recordValue(row, value)
+        row[self.colidx] = value
+        self.invalidateRow(row)
+
+    @Column.type.setter
+    def type(self, t):
+        Column.type.fset(self, t)
+        store = getattr(self.sheet, 'store', None)
+        if store is not None and self.colidx < len(store.vectors):
+            store.retype(self.colidx, t)
+
+
+def ColumnarColumns(colnames, **kwargs):
+    'Return list of ColumnarColumns from given list of column names.'
+    return [ColumnarColumn(colname, i, **kwargs) for i, colname in enumerate(colnames)]
+
+
+def rowAdder(vs, ncols):
+    'Return function to add a list of str fields as a row on `vs`, via a new ColumnarStore if options.columnar.'
+    if not options.columnar:
+        vs.store = None
+        return vs.addRow
+
+    vs.store = ColumnarStore(ncols)
+    return lambda fields, vs=vs: vs.addRow(vs.store.append(fields))
+
+def rowAppender(vs):
+    'Return function to add a list of str fields as a row on `vs`, via its existing ColumnarStore if any.'
+    if getattr(vs, 'store', None) is None:
+        return vs.addRow
+    return lambda fields, vs=vs: vs.addRow(vs.store.append(fields))
@@ -1,6 +1,9 @@
 import random
 
 from .vdtui import *
+from .columnar import *
+from .lazytsv import *
+from .parallel import *
 
 option('confirm_overwrite', True, 'whether to prompt for overwrite confirmation on save')
 option('header', 1, 'parse first N rows of .csv/.tsv as column names')
@@ -24,8 +27,8 @@ globalCommand('zr', 'sheet.cursorRowIndex = int(input("row number: "))', 'move t
 
 globalCommand('R', 'nrows=int(input("random population size: ")); vs=vd.push(copy(sheet)); vs.name+="_sample"; vs.rows=random.sample(rows, nrows)', 'open duplicate sheet with a random population subset of # rows')
 
-globalCommand('a', 'rows.insert(cursorRowIndex+1, newRow()); cursorDown(1)', 'append a blank row')
-globalCommand('ga', 'for r in range(int(input("add rows: "))): addRow(newRow())', 'add N blank rows')
+globalCommand('a', 'addRows([newRow()], cursorRowIndex+1); cursorDown(1)', 'append a blank row')
+globalCommand('ga', 'for r in range(int(input("add rows: "))): addRows([newRow()])', 'add N blank rows')
 
 globalCommand('f', 'fillNullValues(cursorCol, selectedRows or rows)', 'fill null cells in current column with previous non-null value')
 
@@ -189,7 +192,7 @@ def open_tsv(p, vs=None):
     'Parse contents of Path `p` and populate columns.'
 
     if vs is None:
-        vs = Sheet(p.name, source=p)
+        vs = Sheet(p.name, source=p, filetype='tsv')
         vs.loader = lambda vs=vs: reload_tsv(vs)
 
     header_lines = int(options.header)
@@ -198,11 +201,15 @@ def open_tsv(p, vs=None):
         headers = _getTsvHeaders(fp, header_lines or 1)  # get one data line if no headers
 
         if header_lines == 0:
-            vs.columns = ArrayColumns(len(headers[0]))
+            if options.columnar:
+                vs.columns = ColumnarColumns([''] * len(headers[0]), width=8)
+            else:
+                vs.columns = ArrayColumns(len(headers[0]))
         else:
             # columns ideally reflect the max number of fields over all rows
             # but that's a lot of work for a large dataset
-            vs.columns = ArrayNamedColumns('\\n'.join(x) for x in zip(*headers[:header_lines]))
+            colnames = ['\\n'.join(x) for x in zip(*headers[:header_lines])]
+            vs.columns = ColumnarColumns(colnames) if options.columnar else ArrayNamedColumns(colnames)
 
     vs.recalc()
     return vs
@@ -216,8 +223,18 @@ def reload_tsv_sync(vs, **kwargs):
     'Perform synchronous loading of TSV file, discarding header lines.'
     header_lines = kwargs.get('header', options.header)
 
+    if options.tsv_lazy and canLoadLazy(vs.source):
+        return reload_tsv_lazy(vs, header_lines)
+
     delim = options.delimiter
     vs.rows = []
+    addRow = rowAdder(vs, len(vs.columns))
+
+    if canLoadChunked(vs.source):
+        loadChunked(vs, parseTsvChunk, lineOffset(vs.source, header_lines, skipEmpty=True), addRow, delim)
+        status('loaded %s' % vs.name)
+        return
+
     with vs.source.open_text() as fp:
         _getTsvHeaders(fp, header_lines)  # discard header lines
 
@@ -229,7 +246,7 @@ def reload_tsv_sync(vs, **kwargs):
                     break
                 L = L[:-1]
                 if L:
-                    vs.addRow(L.split(delim))
+                    addRow(L.split(delim))
                 prog.addProgress(len(L))
 
     status('loaded %s' % vs.name)
@@ -1,7 +1,9 @@
-from statistics import mode, median, mean, stdev
+from statistics import mode, median
 
 from visidata import *
 
+option('describe_exact', True, 'compute exact distinct, mode and median on describe sheets (False to estimate them in bounded memory)')
+
 globalCommand('I', 'vd.push(DescribeSheet(sheet.name+"_describe", source=sheet, sourceRows=selectedRows or rows))', 'open Describe Sheet')
 
 def isNumeric(col):
@@ -34,7 +36,7 @@ class DescribeSheet(Sheet):
             Column('column', type=str, getter=lambda col,row: row.name),
             DescribeColumn('errors', type=len),
             DescribeColumn('nulls',  type=len),
-            DescribeColumn('distinct',type=len),
+            DescribeColumn('distinct',type=int),
             DescribeColumn('mode',   type=anytype),
             DescribeColumn('min',    type=anytype),
             DescribeColumn('max',    type=anytype),
@@ -45,7 +47,7 @@ class DescribeSheet(Sheet):
     commands = ColumnsSheet.commands + [
         Command('zs', 'source.select(cursorValue)', 'select rows on source sheet which are being described in current cell'),
         Command('zu', 'source.unselect(cursorValue)', 'unselect rows on source sheet which are being described in current cell'),
-        Command('z'+ENTER, 'vs=copy(source); vs.rows=cursorValue; vs.name+="_%s_%s"%(cursorRow.name,cursorCol.name); vd.push(vs)', 'open copy of source sheet with rows described in current cell'),
+        Command('z'+ENTER, 'vs=copy(source); vs.rows=list(cursorValue); vs.name+="_%s_%s"%(cursorRow.name,cursorCol.name); vd.push(vs)', 'open copy of source sheet with rows described in current cell'),
         Command(ENTER, 'vd.push(SheetFreqTable(source, cursorRow))', 'open a Frequency Table sheet grouped on column referenced in current row'),
         Command('!', 'source.toggleKeyColumn(source.columns.index(cursorRow))', 'toggle key column on source sheet')
     ]
@@ -53,40 +55,107 @@ class DescribeSheet(Sheet):
         Colorizer('row', 7, lambda self,c,r,v: options.color_key_col if r in self.source.keyCols else None),
     ]
 
+    @async
     def reload(self):
+        'Describe all source columns in one chunked pass over the source rows.'
         self.rows = list(self.source.columns)  # column deleting/reordering here does not affect actual columns
-        self.describeData = { col: {} for col in self.source.columns }
+        rows = list(self.sourceRows)
+        exact = options.describe_exact
+        describers = [ColumnDescriber(srccol, rows, exact) for srccol in self.source.columns]
+        self.describeData = { d.col: dict(errors=d.errors, nulls=d.nulls) for d in describers }
 
-        for srccol in Progress(self.source.columns):
-            self.reloadColumn(srccol)
+        isNull = isNullFunc()
+        with Progress(total=len(rows)*len(describers)) as prog:
+            for start in range(0, len(rows), 4096):
+                chunk = rows[start:start+4096]
+                for d in describers:
+                    for i, r in enumerate(chunk, start):
+                        d.add(i, r, isNull)
+                    prog.addProgress(len(chunk))
 
-    @async
-    def reloadColumn(self, srccol):
-            d = self.describeData[srccol]
-            isNull = isNullFunc()
-
-            vals = list()
-            d['errors'] = list()
-            d['nulls'] = list()
-            d['distinct'] = set()
-            for sr in self.sourceRows:
+        for d in describers:
+            self.describeData[d.col].update(d.finish())
+
+
+class ColumnDescriber:
+    '''Statistics of one source column, accumulated one row at a time.
+       Errors and nulls are kept as arrays of their indexes into the source rows; the other statistics exactly, or if not `exact` in bounded memory as sketches.'''
+    def __init__(self, col, rows, exact):
+        self.col = col
+        self.errors = IndexedRows(rows, indexArray(len(rows)))
+        self.nulls = IndexedRows(rows, indexArray(len(rows)))
+        self.failed = {}  # [statname] -> exception raised while accumulating it
+
+        self.distinct = set() if exact else HyperLogLog()
+        self.modes = collections.Counter() if exact else HeavyHitters()
+        self.accumulators = [('mode', self.addMode)]
+
+        self.numeric = isNumeric(col)
+        if self.numeric:
+            self.min = self.max = None
+            self.stats = RunningStats()
+            self.medians = [] if exact else P2Quantile(0.5)
+            self.accumulators += [
+                ('min', self.addMinMax),
+                ('mean', self.stats.add),
+                ('median', self.medians.append if exact else self.medians.add),
+            ]
+
+    def addMode(self, v):
+        if isinstance(self.modes, HeavyHitters):
+            self.modes.add(v)
+        else:
+            self.modes[v] += 1
+
+    def addMinMax(self, v):
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+
+    def add(self, i, row, isNull):
+        'Add the value of our column in `row`, which is at index `i` of the source rows.'
+        try:
+            v = self.col.getValue(row)
+            null = isNull(v)
+            if not null:
+                v = self.col.type(v)
+        except Exception as e:
+            self.errors.idxs.append(i)
+            return
+
+        self.distinct.add(v)
+        if null:
+            self.nulls.idxs.append(i)
+            return
+
+        for name, func in self.accumulators:
+            if name not in self.failed:
                 try:
-                    v = srccol.getValue(sr)
-                    if isNull(v):
-                        d['nulls'].append(sr)
-                    else:
-                        v = srccol.type(v)
-                        vals.append(v)
-                    d['distinct'].add(v)
+                    func(v)
                 except Exception as e:
-                    d['errors'].append(sr)
+                    self.failed[name] = e
+
+    def finish(self):
+        'Return dict of statistic name -> value (or exception if it could not be computed).'
+        d = dict(distinct=len(self.distinct))
+        d['mode'] = self.result('mode', self.getMode)
+        if self.numeric:
+            d['min'] = self.result('min', lambda: min([]) if self.min is None else self.min)
+            d['max'] = self.result('min', lambda: max([]) if self.max is None else self.max)
+            d['mean'] = self.result('mean', self.stats.getMean)
+            d['stdev'] = self.result('mean', self.stats.getStdev)
+            d['median'] = self.result('median', lambda: median(self.medians) if isinstance(self.medians, list) else self.medians.value())
+        return d
 
-            d['mode'] = self.calcStatistic(d, mode, vals)
-            if isNumeric(srccol):
-                for func in [mode, min, max, median, mean, stdev]:
-                    d[func.__name__] = self.calcStatistic(d, func, vals)
+    def getMode(self):
+        if isinstance(self.modes, HeavyHitters):
+            return self.modes.mode()
+        if not self.modes:
+            return mode([])  # raises StatisticsError
+        return self.modes.most_common(1)[0][0]
 
-    def calcStatistic(self, d, func, *args, **kwargs):
-        r = returnException(func, *args, **kwargs)
-        d[func.__name__] = r
-        return r
+    def result(self, name, func):
+        if name in self.failed:
+            return self.failed[name]
+        return returnException(func)
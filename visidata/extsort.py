@@ -0,0 +1,113 @@
+import heapq
+import operator
+import pickle
+import tempfile
+from array import array
+
+from visidata import *
+
+option('sort_mem_mb', 256, 'max MB of sort keys to hold in memory at once for external sorts, beyond which sorted runs are spilled to temp files')
+
+globalCommand('gz[', 'externalSort(sheet, keyCols or [cursorCol])', 'open copy of sheet sorted ascending by key columns, with an external merge sort for sheets larger than memory')
+globalCommand('gz]', 'externalSort(sheet, keyCols or [cursorCol], reverse=True)', 'open copy of sheet sorted descending by key columns, with an external merge sort for sheets larger than memory')
+
+
+class PermutedRows(LazyRows):
+    '''Sequence of a snapshot of `rows` in the order of the permutation index `perm` (an array of row indexes, which may still be growing).
+
+    Any change to the sequence itself (sort, insert, delete) first copies the rows into a list on the sheet.'''
+    def __init__(self, sheet, rows):
+        super().__init__(sheet)
+        self.rows = list(rows)  # not the source list itself, which its sheet may sort or delete from in place
+        self.perm = array('Q')
+
+    def nRows(self):
+        return len(self.perm)
+
+    def getRow(self, i):
+        return self.rows[self.perm[i]]
+
+    def allRows(self):
+        return [self.rows[i] for i in Progress(self.perm)]
+
+
+sortKey = operator.itemgetter(0)  # stable on ties, as sorts are by key only, of pairs in rowidx order
+
+def spillRun(pairs, blocksize=4096):
+    'Write sorted (key, rowidx) `pairs` to a new temp file, in pickled blocks.'
+    fp = tempfile.TemporaryFile()
+    for i in range(0, len(pairs), blocksize):
+        pickle.dump(pairs[i:i+blocksize], fp, pickle.HIGHEST_PROTOCOL)
+    fp.seek(0)
+    return fp
+
+def readRun(fp):
+    'Generate (key, rowidx) pairs from a temp file written by spillRun, closing it at the end.'
+    with fp:
+        while True:
+            try:
+                block = pickle.load(fp)
+            except EOFError:
+                return
+            yield from block
+
+def sortedRuns(rows, cols, reverse):
+    '''Return list of iterators of (key, rowidx) for sorted runs of `rows` by the typed values of `cols`.
+       Keys are ascending, with the values of columns to be sorted in reverse wrapped in Reversed.
+       Each run but the last is spilled to a temp file once its keys reach options.sort_mem_mb.'''
+    budget = options.sort_mem_mb*1024*1024
+    runs = []
+    pairs = []
+    size = 0
+    with Progress(total=len(rows)) as prog:
+        for start in range(0, len(rows), 4096):
+            chunk = rows[start:start+4096]
+            keyvecs = []
+            for col, rev in zip(cols, reverse):
+                vals = col.getTypedVector(chunk).values
+                if rev:
+                    vals = [Reversed(v) for v in vals]
+                keyvecs.append(vals)
+
+            for i, key in enumerate(zip(*keyvecs)):
+                pairs.append((key, start+i))
+                size += sum(sys.getsizeof(k) for k in key) + 120  # and the tuples and list slot
+            prog.addProgress(len(chunk))
+
+            if size > budget:
+                pairs.sort(key=sortKey)
+                runs.append(readRun(spillRun(pairs)))
+                pairs = []
+                size = 0
+
+    pairs.sort(key=sortKey)
+    runs.append(iter(pairs))
+    return runs
+
+def externalOrder(rows, cols, reverse=False):
+    'Generate indexes of `rows` in order of the typed values of `cols`, as merged from sorted runs.'
+    if isinstance(reverse, bool):
+        reverse = [reverse]*len(cols)
+    runs = sortedRuns(rows, cols, reverse)
+    for key, rowidx in heapq.merge(*runs):  # (key, rowidx) pairs are unique, so rowidx breaks ties between runs
+        yield rowidx
+
+
+@async
+def loadExternalSorted(vs, rows, cols, reverse):
+    'Append indexes to the permutation of `vs.rows` in sorted order, as the merge produces them.'
+    perm = vs.rows.perm
+    with Progress(total=len(rows)) as prog:
+        for rowidx in externalOrder(rows, cols, reverse):
+            perm.append(rowidx)
+            prog.addProgress(1)
+
+def externalSort(vs, cols, reverse=False):
+    'Push copy of sheet `vs` with its rows sorted by `cols`, filled by an external merge sort.'
+    if not cols:
+        error('no columns to sort by')
+    ret = copy(vs)
+    ret.name = vs.name + '_sorted'
+    ret.rows = PermutedRows(ret, vs.rows)
+    vd().push(ret)
+    loadExternalSorted(ret, ret.rows.rows, cols, reverse)
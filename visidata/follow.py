@@ -0,0 +1,122 @@
+import io
+import csv
+import zlib
+import weakref
+
+from visidata.vdtui import *
+from visidata.columnar import rowAppender
+from visidata.lazytsv import LazyTsvRows
+from visidata.loaders.csv import csvOptions
+
+option('follow_interval', 1.0, 'seconds between checks for data appended to the source of followed sheets')
+
+globalCommand('^R', 'reloadSheet(sheet)', 'reload current sheet (only appended data, if followed)')
+globalCommand('g^R', 'toggleFollow(sheet)', 'toggle following data appended to source of current sheet, like tail -f')
+
+followMarks = weakref.WeakKeyDictionary()   # [sheet] -> (offset, crc of prefix), or None until the first load is finished
+_lastCheck = [0]
+
+
+def prefixCrc(fp, offset, n=65536):
+    'Return checksum of up to `n` bytes just before `offset` in binary file `fp`.'
+    start = max(offset-n, 0)
+    fp.seek(start)
+    return zlib.crc32(fp.read(offset-start))
+
+def markSource(vs, offset):
+    with open(vs.source.resolve(), 'rb') as fp:
+        followMarks[vs] = (offset, prefixCrc(fp, offset))
+
+def appendTsv(vs, fp):
+    addRow = rowAppender(vs)
+    delim = options.delimiter
+    for L in fp:
+        L = L.rstrip('\r\n')
+        if L:
+            addRow(L.split(delim))
+
+def appendCsv(vs, fp):
+    addRow = rowAppender(vs)
+    for r in csv.reader(fp, **csvOptions()):
+        addRow(r)
+
+def appendTxt(vs, fp):
+    for L in fp:
+        vs.addLine(L.rstrip('\r\n'))
+
+appendParsers = {
+    'tsv': appendTsv,
+    'csv': appendCsv,
+    'txt': appendTxt,
+}
+
+def canFollow(vs):
+    p = vs.source
+    return isinstance(p, Path) and not isinstance(p, PathFd) and not p.gzip_compressed and getattr(vs, 'filetype', None) in appendParsers
+
+def toggleFollow(vs):
+    if vs in followMarks:
+        del followMarks[vs]
+        status('no longer following %s' % vs.name)
+    elif not canFollow(vs):
+        error('can only follow uncompressed tsv/csv/txt files')
+    else:
+        followMarks[vs] = None
+        if not vs.currentThreads:  # already loaded
+            markSource(vs, vs.source.filesize)
+        status('following %s' % vs.name)
+
+def reloadSheet(vs):
+    'Reload `vs` from its source, or parse only data appended since the last load if it is being followed.'
+    if vs in followMarks:
+        if followMarks[vs] is None:
+            warning('%s is still loading' % vs.name)
+        else:
+            status('%s new rows' % reloadAppended(vs))
+    else:
+        vs.reload()
+        vs.recalc()
+        status('reloaded')
+
+def reloadAppended(vs):
+    'Add rows parsed from lines appended to the source since the last load; reload fully if the earlier contents changed.  Return number of rows added.'
+    offset, crc = followMarks[vs]
+    p = vs.source
+    with open(p.resolve(), 'rb') as fp:
+        if p.filesize < offset or prefixCrc(fp, offset) != crc:
+            followMarks[vs] = None
+            status('%s changed; reloading' % p.name)
+            vs.reload()
+            vs.recalc()
+            return 0
+
+        nrows = len(vs.rows)
+        if isinstance(vs.rows, LazyTsvRows):
+            vs.rows.remap()
+            markSource(vs, p.filesize)
+            return len(vs.rows) - nrows
+
+        fp.seek(offset)
+        data = fp.read()
+
+    data = data[:data.rfind(b'\n')+1]   # leave any partial last line for next time
+    if data:
+        appendParsers[vs.filetype](vs, io.TextIOWrapper(io.BytesIO(data), encoding=options.encoding, errors=options.encoding_errors))
+        markSource(vs, offset+len(data))
+    return len(vs.rows) - nrows
+
+def checkFollowed():
+    'Parse data appended to followed sheets on the sheet stack, every options.follow_interval seconds.'
+    if not followMarks or time.time() - _lastCheck[0] < options.follow_interval:
+        return
+    _lastCheck[0] = time.time()
+    for vs in list(followMarks):
+        if vs not in vd().sheets:
+            continue
+        if followMarks[vs] is None:
+            if not vs.currentThreads:  # initial load finished
+                markSource(vs, vs.source.filesize)
+        elif not vs.currentThreads:
+            reloadAppended(vs)
+
+vd().addHook('predraw', checkFollowed)
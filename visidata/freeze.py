@@ -1,32 +1,233 @@
+from array import array
+
 from visidata import *
 from copy import deepcopy
 
 globalCommand("'", 'addColumn(StaticColumn(sheet.rows, cursorCol), cursorColIndex+1)', 'add a frozen copy of current column with all cells evaluated')
 globalCommand("g'", 'vd.push(StaticSheet(sheet)); status("pushed frozen copy of "+name)', 'open a frozen copy of current sheet with all visible columns evaluated')
-globalCommand("z'", 'cursorCol._cachedValues = collections.OrderedDict(); status("added cache to " + cursorCol.name)', 'add/reset cache for this column')
-globalCommand("gz'", 'for c in visibleCols: c._cachedValues = collections.OrderedDict()', 'add/reset cache for all visible columns')
+globalCommand("z'", 'cursorCol.setCache(input("cache policy (lru/lfu/full): ", value=options.col_cache_policy)); status("added cache to " + cursorCol.name)', 'add/reset cache for this column, with the given policy')
+globalCommand("gz'", 'setCaches(visibleCols, input("cache policy (lru/lfu/full): ", value=options.col_cache_policy))', 'add/reset cache for all visible columns, with the given policy')
 globalCommand("zg'", "gz'")
 
 
+def setCaches(cols, policy):
+    for c in cols:
+        c.setCache(policy)
+    status('added %s cache to %d columns' % (policy, len(cols)))
+
+class FrozenVector:
+    '''Values of one column in compact storage: an array of typed values for int/float/currency/date (as epoch seconds),
+       or else codes into a dictionary of the distinct values.  Values which do not fit (nulls, errors, unhashables) are kept in an overlay.'''
+    arraytypes = {int: 'q', float: 'd', currency: 'd', date: 'd'}
+
+    def __init__(self, t):
+        self.type = t
+        typecode = self.arraytypes.get(t)
+        self.values = array(typecode or 'I')
+        self.dictionary = None if typecode else []  # [code] -> value
+        self.codes = None if typecode else {}       # [value] -> code
+        self.edits = {}   # [idx] -> value, for values not in the typed array or dictionary
+
+    def __len__(self):
+        return len(self.values)
+
+    def __copy__(self):
+        'Return vector sharing the values (which are only ever appended to), with its own copy of the edits.'
+        ret = FrozenVector.__new__(FrozenVector)
+        ret.__dict__.update(self.__dict__)
+        ret.edits = dict(self.edits)
+        return ret
+
+    def append(self, v):
+        try:
+            if self.dictionary is None:
+                self.values.append(self.encode(v))
+            else:
+                code = self.codes.get(v)
+                if code is None:
+                    code = self.codes[v] = len(self.dictionary)
+                    self.dictionary.append(v)
+                self.values.append(code)
+        except Exception:
+            self.edits[len(self.values)] = v
+            self.values.append(0)
+
+    def encode(self, v):
+        'Return typed value of `v` to store in the array, or raise if it would not round-trip.'
+        if v is None or isinstance(v, Exception):
+            raise ValueError(v)
+        t = self.type
+        if t is date:
+            d = date(v)
+            x = float(d)
+            if date(x).dt != d.dt:
+                raise ValueError(v)
+            return x
+        return t(v)
+
+    def get(self, i):
+        if self.edits and i in self.edits:
+            return self.edits[i]
+        v = self.values[i]
+        if self.dictionary is not None:
+            return self.dictionary[v]
+        if self.type is date:
+            return date(v)
+        return v
+
+    def set(self, i, v):
+        self.edits[i] = v
+
+    def isTyped(self, i):
+        'True if the value at `i` is already of the column type.'
+        return self.dictionary is None and not (self.edits and i in self.edits)
+
+
+def freezeValues(col, rows):
+    'Return FrozenVector of the values of `col` for `rows`, with any exception from the getter as the value.'
+    vec = FrozenVector(col.type)
+    for r in Progress(rows):
+        try:
+            v = col.getValue(r)
+        except Exception as e:
+            v = e
+        vec.append(v)
+    return vec
+
+
+class FrozenColumn(Column):
+    '''Column of values frozen in a FrozenVector, at the index for each row given by rowidx(row).
+       Rows without an index (None), which were added after the values were frozen, are null until set.'''
+    def __init__(self, name, vector, rowidx, **kwargs):
+        super().__init__(name, **kwargs)
+        self.vector = vector
+        self.rowidx = rowidx
+        self.edits = {}  # [id(row)] -> (row, value) set for rows without an index
+
+    def __copy__(self):
+        'Copy with its own edits, so that cells set on a copy of the sheet do not change the original.'
+        ret = super().__copy__()
+        ret.vector = copy(self.vector)
+        ret.edits = dict(self.edits)
+        return ret
+
+    def replaceRow(self, oldrow, newrow):
+        'Keep the frozen value of `oldrow` (and any value set for it) for `newrow`.'
+        rowpos = getattr(self, 'rowpos', None)
+        if rowpos is not None and id(oldrow) in rowpos:
+            rowpos[id(newrow)] = rowpos[id(oldrow)]
+            self.frozenRows.append(newrow)  # keep alive, so its id is not reused
+        e = self.edits.get(id(oldrow))
+        if e and e[0] is oldrow:
+            self.edits[id(newrow)] = (newrow, e[1])
+
+    def calcValue(self, row):
+        i = self.rowidx(row)
+        if i is None:
+            e = self.edits.get(id(row))
+            return e[1] if e and e[0] is row else None
+        v = self.vector.get(i)
+        if isinstance(v, Exception):
+            raise v
+        return v
+
+    def setValue(self, row, value):
+        self.recordValue(row, value)
+        i = self.rowidx(row)
+        if i is None:
+            self.edits[id(row)] = (row, value)
+        else:
+            self.vector.set(i, value)
+        self.invalidateRow(row)
+
+    def getTypedVector(self, rows):
+        'Return TypedValues for `rows` directly from the frozen values, converting only those not stored as the column type.'
+        if self.type is not self.vector.type or self._cachedValues is not None or self.edits:
+            return super().getTypedVector(rows)
+        sheetRows = self.sheet is not None and rows is self.sheet.rows
+        rows = list(rows)  # snapshot, as the sheet rows may be added to or changed in place
+        tv = self._typedVector
+        if tv is not None and tv.sameRows(rows):
+            return tv
+
+        t = self.type
+        vec = self.vector
+        isNull = isNullFunc()
+        n = len(rows)
+        values = [None]*n
+        errors = bytearray(n)
+        nulls = bytearray(n)
+        for i, j in enumerate(Progress(map(self.rowidx, rows), total=n)):
+            try:
+                if j is None:
+                    v = None
+                else:
+                    v = vec.get(j)
+                    if not vec.isTyped(j):
+                        v = t(v)
+                nulls[i] = isNull(v)
+            except Exception:
+                v = t()
+                errors[i] = 1
+            values[i] = v
+
+        tv = TypedValues(rows, values, errors, nulls)
+        if sheetRows:
+            self._typedVector = tv
+        return tv
+
+
 def StaticColumn(rows, col):
-    c = deepcopy(col)
-    frozenData = {id(r):col.getValue(r) for r in rows}
-    c.calcValue=lambda row,d=frozenData: d[id(row)]
-    c.setter=lambda col,row,val,d=frozenData: setitem(d, id(row), val)
-    c.name = c.name + '_frozen'
+    'Return frozen copy of `col` for `rows`.'
+    rows = list(rows)   # also keeps the rows alive, so their ids cannot be reused by other rows
+    rowpos = {id(r): i for i, r in enumerate(rows)}
+    c = FrozenColumn(col.name + '_frozen', freezeValues(col, rows), lambda row: rowpos.get(id(row)),
+                     type=col.type, width=col.width, fmtstr=col.fmtstr)
+    c.frozenRows = rows
+    c.rowpos = rowpos   # [id(row)] -> index of its frozen value
+    if hasattr(col, 'aggregators'):
+        c.aggregators = list(col.aggregators)
     return c
 
 
+class FrozenRow:
+    'Row of a StaticSheet, as its index into the frozen column values.'
+    __slots__ = ('idx',)
+
+    def __init__(self, idx):
+        self.idx = idx
+
+    def __repr__(self):
+        return '<FrozenRow %s>' % self.idx
+
+
+frozenRowIdx = operator.attrgetter('idx')
+
 class StaticSheet(Sheet):
-    'A copy of the source sheet with all cells frozen.'
+    'A copy of the source sheet with all cells frozen, into compact per-column storage.'
     def __init__(self, source):
         super().__init__(source.name + "'", source=source)
 
-        self.columns = [ColumnItem(col.name, i, width=col.width, type=col.type) for i,col in enumerate(self.source.columns)]
+        self.columns = [FrozenColumn(col.name, FrozenVector(col.type), frozenRowIdx, width=col.width, type=col.type, fmtstr=col.fmtstr)
+                            for col in self.source.columns]
         self.nKeys = source.nKeys
 
+    def newRow(self):
+        'Return FrozenRow for a new null value appended to each frozen column.'
+        n = len(self.rows)
+        for c in self.columns:
+            if isinstance(c, FrozenColumn) and c.rowidx is frozenRowIdx:
+                n = len(c.vector)
+                c.vector.append(None)
+        return FrozenRow(n)
+
     @async
     def reload(self):
+        'Freeze the source columns one at a time, and then show the rows.'
         self.rows = []
-        for r in Progress(self.source.rows):
-            self.addRow([col.getValue(r) for col in self.source.columns])
+        rows = list(self.source.rows)
+        with Progress(total=len(rows)*len(self.columns)) as prog:
+            for c, srccol in zip(self.columns, self.source.columns):
+                c.vector = freezeValues(srccol, rows)
+                prog.addProgress(len(rows))
+        self.rows = [FrozenRow(i) for i in range(len(rows))]
@@ -1,4 +1,5 @@
 import math
+import bisect
 
 from visidata import *
 globalCommand('F', 'vd.push(SheetFreqTable(sheet, cursorCol))', 'open Frequency Table grouped on current column')
@@ -7,8 +8,8 @@ globalCommand('zF', 'vd.push(SheetFreqTable(sheet, Column("Total", getter=lambda
 
 theme('disp_histogram', '*', 'histogram element character')
 option('disp_histolen', 80, 'width of histogram column')
-#option('histogram_bins', 0, 'number of bins for histogram of numeric columns')
-#option('histogram_even_interval', False, 'if histogram bins should have even distribution of rows')
+option('histogram_bins', 0, 'number of bins for histogram of numeric columns (0 for the square root of the number of values)')
+option('histogram_even_interval', False, 'if histogram bins should have even distribution of rows')
 
 ColumnsSheet.commands += [
     Command(ENTER, 'vd.push(SheetFreqTable(source, cursorRow))', 'open a Frequency Table grouped on column referenced in current row')
@@ -24,7 +25,7 @@ def getValueOrError(c, r):
 def valueNames(vals):
     return '-'.join(str(v) for v in vals)
 
-# rowdef: ([bin_values], source_rows)
+# rowdef: ([bin_values], source_rows), with source_rows as IndexedRows for discrete bins
 class SheetFreqTable(Sheet):
     'Generate frequency-table sheet on currently selected column.'
     rowtype = 'bins'
@@ -35,7 +36,8 @@ class SheetFreqTable(Sheet):
         Command('u', 'unselect([cursorRow]); cursorDown(1)', 'unselect these entries in source sheet'),
 
         Command(ENTER, 'vs = copy(source); vs.name += "_"+valueNames(cursorRow[0]); vs.rows=copy(cursorRow[1]); vd.push(vs)', 'push new sheet with only source rows for this value'),
-#        Command('w', 'options.histogram_even_interval = not options.histogram_even_interval; reload()', 'toggle histogram_even_interval option')
+        Command('w', 'options.histogram_even_interval = not options.histogram_even_interval; rebin()', 'toggle histogram_even_interval option and rebin numeric histogram'),
+        Command('gw', 'options.histogram_bins = int(input("number of bins: ", value=options.histogram_bins)); rebin()', 'set number of bins and rebin numeric histogram'),
     ]
 
     def __init__(self, sheet, *columns):
@@ -43,6 +45,8 @@ class SheetFreqTable(Sheet):
         super().__init__(fqcolname, source=sheet)
         self.origCols = columns
         self.largest = 100
+        self.sortedValues = None  # sorted values of a numeric column, to be cut into bins by rebin()
+        self.aggregates = {}      # [(id(binrow), origcol)] -> (binrow, {aggregator: result})
 
         self.nKeys = len(self.origCols)
 
@@ -58,7 +62,7 @@ class SheetFreqTable(Sheet):
 
         aggregatedCols = [Column(aggregator.__name__+'_'+c.name,
                                  type=aggregator.type or c.type,
-                                 getter=lambda col,row,origcol=c,aggr=aggregator: aggr(origcol, row[1]))
+                                 getter=lambda col,row,origcol=c,aggr=aggregator: col.sheet.binAggregate(row, origcol, aggr))
                              for c in self.source.visibleCols
                                 for aggregator in getattr(c, 'aggregators', [])
                          ]
@@ -69,6 +73,20 @@ class SheetFreqTable(Sheet):
                 c.width = 0
 
 
+    def binAggregate(self, row, origcol, aggr):
+        'Return result of `aggr` over `origcol` for the source rows in bin `row`, computing all aggregators of `origcol` together the first time.'
+        k = (id(row), origcol)
+        e = self.aggregates.get(k)
+        if e is None or e[0] is not row or aggr not in e[1]:
+            aggrs = list(getattr(origcol, 'aggregators', []))
+            if aggr not in aggrs:
+                aggrs.append(aggr)
+            e = self.aggregates[k] = (row, dict(zip(aggrs, aggregateValues(origcol, aggrs, row[1]))))
+        ret = e[1][aggr]
+        if isinstance(ret, Exception):
+            raise ret
+        return ret
+
     def selectRow(self, row):
         self.source.select(row[1])     # select all entries in the bin on the source sheet
         return super().selectRow(row)  # then select the bin itself on this sheet
@@ -78,81 +96,76 @@ class SheetFreqTable(Sheet):
         return super().unselectRow(row)
 
     def numericBinning(self):
-        nbins = options.histogram_bins or int(len(self.source.rows) ** (1./2))
-
+        'Sort the non-null values of the source column once, then cut them into bins.'
         origCol = self.origCols[0]
         self.columns[0].type = str
 
-        # separate rows with errors at the column from those without errors
-        errorbin = []
-        allbin = []
-        for row in Progress(self.source.rows):
-            v = origCol.getTypedValue(row)
-            if not v:
-                errorbin.append(row)
-            else:
-                allbin.append((v, row))
-
-        # find bin pivots from non-error values
-        binPivots = []
-        sortedValues = sorted(allbin, key=lambda x: x[0])
-
+        tv = origCol.getTypedVector(self.source.rows)
+        vals = tv.values
+        self.binSourceRows = tv.rows
+        self.errorIdxs = indexArray(len(tv), (i for i, err in enumerate(tv.errors) if err))
+        # NaN is binned as null, as it cannot be ordered among the other values
+        self.nullIdxs = indexArray(len(tv), (i for i, (err, null) in enumerate(zip(tv.errors, tv.nulls)) if not err and (null or vals[i] != vals[i])))
+
+        valid = [i for i, (err, null) in enumerate(zip(tv.errors, tv.nulls)) if not err and not null and vals[i] == vals[i]]
+        valid.sort(key=vals.__getitem__)
+        self.sortedIdxs = indexArray(len(tv), valid)
+        self.sortedValues = [vals[i] for i in valid]
+        self.nDistinct = sum(1 for a, b in zip(self.sortedValues, self.sortedValues[1:]) if a != b) + 1 if valid else 0
+        self.rebin()
+
+    def binEdges(self):
+        'Return sorted list of upper bounds of all bins but the last, for equal-width or (if options.histogram_even_interval) equal-count bins.'
+        vals = self.sortedValues
+        nbins = options.histogram_bins or int(len(vals) ** (1./2)) or 1
+        nbins = max(1, min(nbins, self.nDistinct))  # no more bins than values to put in them
         if options.histogram_even_interval:
-            binsize = len(sortedValues)/nbins
-            pivotIdx = 0
-            for i in range(math.ceil(len(sortedValues)/binsize)):
-                firstVal = sortedValues[int(pivotIdx)][0]
-                binPivots.append(firstVal)
-                pivotIdx += binsize
-
+            edges = (vals[len(vals)*i//nbins - 1] for i in range(1, nbins))
         else:
-            minval, maxval = sortedValues[0][0], sortedValues[-1][0]
+            minval, maxval = vals[0], vals[-1]
             binWidth = (maxval - minval)/nbins
-            binPivots = list((minval + binWidth*i) for i in range(0, nbins))
-
-        binPivots.append(None)
-
-        # put rows into bins (as self.rows) based on values
-        binMinIdx = 0
-        binMin = 0
-
-        for binMax in binPivots[1:-1]:
-            binrows = []
-            for i, (v, row) in enumerate(sortedValues[binMinIdx:]):
-                if binMax != binPivots[-2] and v > binMax:
-                    break
-                binrows.append(row)
-
-            binMaxDispVal = origCol.format(binMax)
-            binMinDispVal = origCol.format(binMin)
-            if binMinIdx == 0:
-                binName = '<=%s' % binMaxDispVal
-            elif binMax == binPivots[-2]:
-                binName = '>=%s' % binMinDispVal
-            else:
-                binName = '%s-%s' % (binMinDispVal, binMaxDispVal)
-
-            self.addRow((binName, binrows))
-            binMinIdx += i
-            binMin = binMax
-
-        if errorbin:
-            self.rows.insert(0, ('errors', errorbin))
-
-        ntallied = sum(len(x[1]) for x in self.rows)
-        assert ntallied == len(self.source.rows), (ntallied, len(self.source.rows))
+            edges = (minval + binWidth*i for i in range(1, nbins))
+        return sorted(set(edges))
+
+    def rebin(self):
+        'Set rows to bins of the sorted values, as contiguous ranges found by bisection.  [O(nbins*log(nRows))]'
+        if self.sortedValues is None:
+            error('only frequency tables of a numeric column can be rebinned')
+        rows = self.binSourceRows
+        fmt = self.origCols[0].format
+        self.rows = []
+        self.aggregates = {}
+        for c in self.columns:
+            c.clearCache()
+        for name, idxs in (('errors', self.errorIdxs), ('null', self.nullIdxs)):
+            if idxs:
+                self.addRow(((name,), IndexedRows(rows, idxs)))
+
+        vals = self.sortedValues
+        if vals:
+            sortedIdxs = memoryview(self.sortedIdxs)
+            edges = self.binEdges()
+            lo = 0
+            for i, binMax in enumerate(edges + [None]):
+                if binMax is None:
+                    hi = len(vals)
+                    binName = '>%s' % fmt(edges[-1]) if edges else fmt(vals[0])
+                else:
+                    hi = bisect.bisect_right(vals, binMax, lo)
+                    binName = '<=%s' % fmt(binMax) if i == 0 else '%s-%s' % (fmt(edges[i-1]), fmt(binMax))
+                if hi > lo:  # equal-width bins may have no values
+                    self.addRow(((binName,), IndexedRows(rows, sortedIdxs[lo:hi])))
+                lo = hi
+
+        self.largest = max([100] + [len(r[1]) for r in self.rows])
 
     def discreteBinning(self):
-        rowidx = {}
-        for r in Progress(self.source.rows):
-            v = tuple(getValueOrError(c, r) for c in self.origCols)
-            histrow = rowidx.get(v)
-            if histrow is None:
-                histrow = (v, [])
-                rowidx[v] = histrow
-                self.addRow(histrow)
-            histrow[1].append(r)
-            self.largest = max(self.largest, len(histrow[1]))
+        rows = list(self.source.rows)  # bins index into the rows as of now
+        origCols = self.origCols
+        groups = groupRows(rows, lambda r: tuple(getValueOrError(c, r) for c in origCols))
+        for v, idxs in groups.items():
+            self.addRow((v, IndexedRows(rows, idxs)))
+        self.largest = max([self.largest] + [len(idxs) for idxs in groups.values()])
 
         self.rows.sort(key=lambda r: len(r[1]), reverse=True)  # sort by num reverse
 
@@ -161,14 +174,15 @@ class SheetFreqTable(Sheet):
     def reload(self):
         'Generate histrow for each row and then reverse-sort by length.'
         self.rows = []
+        self.aggregates = {}
 
-#        if len(self.origCols) == 1 and self.origCols[0].type in (int, float, currency):
-#            self.numericBinning()
-#        else:
-        self.discreteBinning()
+        if len(self.origCols) == 1 and self.origCols[0].type in (int, float, currency):
+            self.numericBinning()
+        else:
+            self.discreteBinning()
 
         # automatically add cache to all columns now that everything is binned
         for c in self.visibleCols:
-            c._cachedValues = collections.OrderedDict()
+            c.setCache()
 
 
@@ -86,14 +86,17 @@ class GraphSheet(InvertedYGridCanvas):
         status('loading data points')
         catcols = [c for c in self.xcols if not isNumeric(c)]
         numcol = numericCols(self.xcols)[0]
+        rows = self.sourceRows  # rows being plotted from source
+        xvals = numcol.getTypedVector(rows).values if self.xcols else None
         for ycol in self.ycols:
-            for rownum, row in enumerate(Progress(self.sourceRows)):  # rows being plotted from source
+            yvals = ycol.getTypedVector(rows).values
+            for rownum, row in enumerate(Progress(rows)):
                 try:
                     k = tuple(c.getValue(row) for c in catcols) if catcols else (ycol.name,)
                     attr = self.plotColor(k)
 
-                    graph_x = float(numcol.getTypedValue(row)) if self.xcols else rownum
-                    graph_y = ycol.getTypedValue(row)
+                    graph_x = float(xvals[rownum]) if self.xcols else rownum
+                    graph_y = yvals[rownum]
 
                     self.point(graph_x, graph_y, attr, row)
                     nplotted += 1
@@ -0,0 +1,46 @@
+from array import array
+from collections.abc import Sequence
+
+from .vdtui import *
+
+
+def indexArray(n, idxs=()):
+    'Return array of `idxs` into a sequence of `n` items, with the smallest item size that fits.'
+    return array('I' if n < 2**32 else 'Q', idxs)
+
+
+class IndexedRows(Sequence):
+    'Read-only sequence of the `rows` at the indexes in array `idxs`, as a compact list of the rows in one group.'
+    def __init__(self, rows, idxs):
+        self.rows = rows
+        self.idxs = idxs
+
+    def __len__(self):
+        return len(self.idxs)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self.rows[i] for i in self.idxs[k]]
+        return self.rows[self.idxs[k]]
+
+    def __iter__(self):
+        return map(self.rows.__getitem__, self.idxs)
+
+    def __copy__(self):
+        return list(self)
+
+    def __repr__(self):
+        return '<%s rows>' % len(self)
+
+
+def groupRows(rows, keyfunc):
+    'Return OrderedDict of key -> array of indexes of `rows` with that key(row), in order of first appearance.'
+    n = len(rows)
+    groups = collections.OrderedDict()
+    for i, r in enumerate(Progress(rows)):
+        k = keyfunc(r)
+        idxs = groups.get(k)
+        if idxs is None:
+            idxs = groups[k] = indexArray(n)
+        idxs.append(i)
+    return groups
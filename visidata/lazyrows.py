@@ -0,0 +1,108 @@
+import weakref
+from collections.abc import Sequence
+
+from .vdtui import *
+
+
+class LazyRows(Sequence):
+    '''Sequence of rows got by getRow(i) only as they are accessed, so that a sheet can show rows without having them all in a list.
+
+    Any change to the sequence itself (sort, insert, delete) first makes a list of all rows, which replaces this sequence as the sheet rows.'''
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.materialized = None     # list of all rows, once any change is made
+
+    def nRows(self):
+        'Return number of rows.  Override in subclass.'
+        return 0
+
+    def getRow(self, i):
+        'Return row at index `i`, which is in range.  Override in subclass.'
+        raise IndexError(i)
+
+    def allRows(self):
+        'Return list of all rows.  Override in subclass if there is a faster way than getRow for each.'
+        return [self.getRow(i) for i in Progress(range(self.nRows()))]
+
+    def __len__(self):
+        if self.materialized is not None:
+            return len(self.materialized)
+        return self.nRows()
+
+    def __getitem__(self, k):
+        if self.materialized is not None:
+            return self.materialized[k]
+        if isinstance(k, slice):
+            return [self.getRow(i) for i in range(*k.indices(len(self)))]
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError('row index out of range')
+        return self.getRow(k)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def materialize(self):
+        'Make a list of all rows, which replaces this sequence as the sheet rows.'
+        if self.materialized is None:
+            self.materialized = self.allRows()
+            if self.sheet.rows is self:
+                self.sheet.rows = self.materialized
+        return self.materialized
+
+    def __setitem__(self, k, v):
+        self.materialize()[k] = v
+
+    def __delitem__(self, k):
+        del self.materialize()[k]
+
+    def __copy__(self):
+        return list(self)
+
+    def __getattr__(self, k):
+        'Forward list methods that change the rows (sort, insert, pop, etc) to the materialized list'
+        if k.startswith('_'):
+            raise AttributeError(k)
+        return getattr(self.materialize(), k)
+
+
+class CachedRows(LazyRows):
+    '''LazyRows made by calcRow(i), keeping the most recently used rows.
+       The same row object is returned for an index while it is in the cache or still referenced elsewhere (e.g. selected),
+       so rows must be weakly referenceable.'''
+    def __init__(self, sheet):
+        super().__init__(sheet)
+        self.cache = collections.OrderedDict()  # [idx] -> row, the most recently used rows
+        self.alive = weakref.WeakValueDictionary()  # [idx] -> row still referenced elsewhere
+
+    def cacheSize(self):
+        'Return max number of rows to keep in the cache.  Override in subclass.'
+        return 0
+
+    def calcRow(self, i):
+        'Return new row for index `i`.  Override in subclass.'
+        raise IndexError(i)
+
+    def getRow(self, i):
+        row = self.cache.get(i)
+        if row is not None:
+            self.cache.move_to_end(i)
+            return row
+
+        row = self.alive.get(i)
+        if row is None:
+            row = self.calcRow(i)
+            self.alive[i] = row
+
+        self.cache[i] = row
+        while len(self.cache) > self.cacheSize():
+            self.cache.popitem(last=False)
+        return row
+
+    def materialize(self):
+        if self.materialized is None:
+            super().materialize()
+            self.cache.clear()  # all rows are in the list now
+        return self.materialized
@@ -0,0 +1,126 @@
+import mmap
+import bisect
+from array import array
+
+from .vdtui import *
+from .lazyrows import *
+
+option('tsv_lazy', False, 'mmap .tsv files and parse only the rows being viewed')
+option('tsv_lazy_cache', 10000, 'number of parsed rows to keep for lazily loaded .tsv files')
+
+
+class TsvLine(list):
+    'List of fields parsed from one line of a LazyTsvRows; pins itself when changed.'
+    __slots__ = ('lazyrows', 'idx', '__weakref__')
+
+    def __setitem__(self, k, v):
+        super().__setitem__(k, v)
+        self.lazyrows.pinned[self.idx] = self
+
+    def __copy__(self):
+        'Copy as a plain list of the fields, which does not belong to the lazy rows.'
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return list(self)  # the fields are strs
+
+
+eol = re.compile(rb'\r\n|\r|\n')  # universal newlines, as in text mode
+
+class LazyTsvRows(CachedRows):
+    '''Sequence of rows over an mmapped .tsv file, indexed by line offset and split only when accessed.
+
+    Any change to the sequence itself (sort, insert, delete) first parses all lines into a list on the sheet.'''
+    def __init__(self, sheet, fp, delim):
+        super().__init__(sheet)
+        self.mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.delim = delim.encode(options.encoding)
+        self.offsets = array('Q')    # start of each non-empty line, after the headers
+        self.partialLast = False     # True if the last indexed line has no line ending (yet)
+        self.indexed = threading.Event()
+        self.pinned = {}             # [idx] -> TsvLine which has been edited
+
+    def indexLines(self, header_lines, pos=0):
+        'Scan for line offsets from `pos`, skipping the first `header_lines` non-empty lines.'
+        mm = self.mm
+        m = True
+        with Progress(total=len(mm)-pos) as prog:
+            while pos < len(mm):
+                m = eol.search(mm, pos)
+                end, nextpos = m.span() if m else (len(mm), len(mm))
+                if end > pos:  # skip empty lines
+                    if header_lines > 0:
+                        header_lines -= 1
+                    else:
+                        self.offsets.append(pos)
+                prog.addProgress(nextpos-pos)
+                pos = nextpos
+        self.partialLast = not m
+        self.indexed.set()
+
+    def remap(self):
+        'Map the file again and index any lines appended to it.'
+        pos = len(self.mm)
+        pinnedAt = {}  # [byte offset] -> edited TsvLine which is indexed again
+        if self.partialLast:  # reparse the last line, which may have been only partly written
+            pos = self.offsets.pop()
+            i = len(self.offsets)
+            for d in (self.cache, self.alive):
+                d.pop(i, None)
+            if i in self.pinned:
+                pinnedAt[pos] = self.pinned.pop(i)
+        with open(self.sheet.source.resolve(), 'rb') as fp:
+            self.mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.indexLines(0, pos)
+
+        # keep edits of the lines indexed again, which still start at the same offset
+        for offset, row in pinnedAt.items():
+            i = bisect.bisect_left(self.offsets, offset)
+            if i < len(self.offsets) and self.offsets[i] == offset:
+                row.idx = i
+                self.pinned[i] = self.alive[i] = row
+            else:
+                status('edited line at byte %s is no longer in %s' % (offset, self.sheet.name))
+
+    def cacheSize(self):
+        return options.tsv_lazy_cache
+
+    def nRows(self):
+        return len(self.offsets)
+
+    def calcRow(self, i):
+        'Return new TsvLine parsed from line `i`.  Edited lines are not parsed again, as pinning keeps them alive.'
+        start = self.offsets[i]
+        m = eol.search(self.mm, start)
+        L = self.mm[start:m.start() if m else len(self.mm)]
+        row = TsvLine(x.decode(options.encoding, options.encoding_errors) for x in L.split(self.delim))
+        row.lazyrows = self
+        row.idx = i
+        return row
+
+    def allRows(self):
+        'Split all lines at once, keeping the rows already parsed.'
+        self.indexed.wait()
+        keep = dict(self.alive)
+        keep.update(self.pinned)
+        delim = self.delim.decode(options.encoding)
+        rows = []
+        if self.offsets:
+            lines = (L for L in self.mm[self.offsets[0]:].splitlines() if L)
+            for i, L in enumerate(Progress(lines, total=len(self.offsets))):
+                row = keep.get(i)
+                rows.append(L.decode(options.encoding, options.encoding_errors).split(delim) if row is None else row)
+        return rows
+
+
+def canLoadLazy(p):
+    'True if Path `p` is an uncompressed, non-empty, regular file that can be mmapped.'
+    return not isinstance(p, PathFd) and not p.gzip_compressed and bool(p.stat() and p.filesize)
+
+def reload_tsv_lazy(vs, header_lines):
+    'Set rows of `vs` to a LazyTsvRows over its source, and index the line offsets.'
+    with open(vs.source.resolve(), 'rb') as fp:
+        rows = LazyTsvRows(vs, fp, options.delimiter)
+    vs.rows = rows
+    rows.indexLines(header_lines)
+    status('indexed %s lines of %s' % (len(rows), vs.name))
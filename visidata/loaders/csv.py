@@ -10,7 +10,7 @@ option('csv_skipinitialspace', True, 'skipinitialspace passed to csv.reader')
 csv.field_size_limit(sys.maxsize)
 
 def open_csv(p):
-    vs = Sheet(p.name, source=p)
+    vs = Sheet(p.name, source=p, filetype='csv')
     vs.loader = lambda vs=vs: load_csv(vs)
     return vs
 
@@ -20,9 +20,23 @@ def wrappedNext(rdr):
     except csv.Error as e:
         return ['[csv.Error: %s]' % e]
 
+def csvOptions():
+    'Return dict of keyword arguments for csv.reader from options.'
+    return dict(dialect=options.csv_dialect,
+                quotechar=options.csv_quotechar,
+                delimiter=options.csv_delimiter,
+                skipinitialspace=options.csv_skipinitialspace)
+
 @async
 def load_csv(vs):
     'Convert from CSV, first handling header row specially.'
+    if not load_csv_sync(vs, chunked=canLoadChunked(vs.source)):
+        status('%s has quoted newlines; parsing serially' % vs.name)
+        load_csv_sync(vs, chunked=False)
+    return vs
+
+def load_csv_sync(vs, chunked=False):
+    'Parse CSV into `vs`, in parallel chunks if `chunked`.  Return False if the chunks could not be parsed independently.'
     with vs.source.open_text() as fp:
         samplelen = min(len(wrappedNext(fp)) for i in range(10))  # for progress only
         fp.seek(0)
@@ -30,11 +44,8 @@ def load_csv(vs):
         for i in range(options.skip):
             wrappedNext(fp)  # discard initial lines
 
-        rdr = csv.reader(fp,
-                         dialect=options.csv_dialect,
-                         quotechar=options.csv_quotechar,
-                         delimiter=options.csv_delimiter,
-                         skipinitialspace=options.csv_skipinitialspace)
+        csvargs = csvOptions()
+        rdr = csv.reader(fp, **csvargs)
 
         vs.rows = []
 
@@ -43,23 +54,34 @@ def load_csv(vs):
 
         if headers:
             # columns ideally reflect the max number of fields over all rows
-            vs.columns = ArrayNamedColumns('\\n'.join(x) for x in zip(*headers))
+            colnames = ['\\n'.join(x) for x in zip(*headers)]
+            vs.columns = ColumnarColumns(colnames) if options.columnar else ArrayNamedColumns(colnames)
+            addRow = rowAdder(vs, len(vs.columns))
         else:
             r = wrappedNext(rdr)
-            vs.addRow(wrappedNext(rdr))
-            vs.columns = ArrayColumns(len(vs.rows[0]))
+            addRow = rowAdder(vs, len(r))
+            addRow(r)
+            if options.columnar:
+                vs.columns = ColumnarColumns([''] * len(r), width=8)
+            else:
+                vs.columns = ArrayColumns(len(r))
 
         vs.recalc()  # make columns usable
-        with Progress(total=vs.source.filesize) as prog:
-            try:
-                while True:
-                    vs.addRow(wrappedNext(rdr))
-                    prog.addProgress(samplelen)
-            except StopIteration:
-                pass
+        if chunked:
+            start = lineOffset(vs.source, options.skip+rdr.line_num)
+            if not loadChunked(vs, parseCsvChunk, start, addRow, csvargs):
+                return False
+        else:
+            with Progress(total=vs.source.filesize) as prog:
+                try:
+                    while True:
+                        addRow(wrappedNext(rdr))
+                        prog.addProgress(samplelen)
+                except StopIteration:
+                    pass
 
     vs.recalc()
-    return vs
+    return True
 
 
 def save_csv(sheet, fn):
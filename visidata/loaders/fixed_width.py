@@ -15,7 +15,10 @@ class FixedWidthColumn(Column):
         return row[0][self.i:self.j]
 
     def setValue(self, row, value):
+        row = self.sheet.ownRow(row)
+        self.recordValue(row, value)
         row[0] = row[:self.i] + '%*s' % (self.j-self.i, value) + row[self.j:]
+        self.invalidateRow(row)
 
 def columnize(rows):
     'Generate (i,j) indexes for fixed-width columns found in rows'
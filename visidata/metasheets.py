@@ -1,3 +1,6 @@
+import bisect
+from array import array
+
 from visidata import *
 
 OptionsSheet.colorizers += [
@@ -45,7 +48,7 @@ columnCommands = [
 
 ColumnsSheet.commands += columnCommands + [
         Command('!', 'source.toggleKeyColumn(cursorRowIndex)', 'toggle column as key on source sheet'),
-        Command('&', 'rows.insert(cursorRowIndex, combineColumns(selectedRows))', 'add column from concatenating selected source columns'),
+        Command('&', 'addRows([combineColumns(selectedRows)], cursorRowIndex)', 'add column from concatenating selected source columns'),
 ]
 DescribeSheet.commands += columnCommands
 
@@ -57,6 +60,89 @@ ColumnsSheet.columns += [
 #### slicing and dicing
 # rowdef: [(key, ...), sheet1_row, sheet2_row, ...]
 #   if a sheet does not have this key, sheet#_row is None
+class JoinRows(VirtualRows):
+    '''Rows of a join, computed on demand: for each group of (key, [row indexes for each source, or None if no rows]),
+       the product of the rows from each source, as [key, row0, row1, ...].'''
+    def __init__(self, sheet, sourceRows, groups):
+        super().__init__(sheet)
+        self.sourceRows = sourceRows  # list of the rows of each source
+        self.groups = groups
+        self.offsets = array('Q', [0])  # index of the first row of each group, then the total
+        for key, idxslist in groups:
+            n = 1
+            for idxs in idxslist:
+                if idxs is not None:
+                    n *= len(idxs)
+            self.offsets.append(self.offsets[-1]+n)
+
+    def nRows(self):
+        return self.offsets[-1]
+
+    def calcRow(self, i):
+        g = bisect.bisect_right(self.offsets, i)-1
+        key, idxslist = self.groups[g]
+        j = i - self.offsets[g]
+        subrows = []
+        for rows, idxs in reversed(list(zip(self.sourceRows, idxslist))):  # last source varies fastest, like itertools.product
+            if idxs is None:
+                subrows.append(None)
+            else:
+                j, k = divmod(j, len(idxs))
+                subrows.append(rows[idxs[k]])
+        return VirtualRow([key] + subrows[::-1])
+
+
+def joinKeys(vs):
+    'Return (rows, keys, isSorted) for the rows of `vs` and their key tuples, converted once.'
+    tvs = [c.getTypedVector(vs.rows) for c in vs.keyCols]
+    if not tvs:
+        return list(vs.rows), [()]*len(vs.rows), False
+    keys = list(zip(*[tv.values for tv in tvs]))
+    try:
+        isSorted = all(a <= b for a, b in zip(keys, itertools.islice(keys, 1, None)))
+    except TypeError:
+        isSorted = False
+    return tvs[0].rows, keys, isSorted
+
+def hashGroups(keys, only=None, prog=None):
+    'Return OrderedDict of key -> array of indexes into `keys`, for keys in `only` if given.'
+    groups = collections.OrderedDict()
+    for i, k in enumerate(keys):
+        if only is None or k in only:
+            idxs = groups.get(k)
+            if idxs is None:
+                idxs = groups[k] = indexArray(len(keys))
+            idxs.append(i)
+    if prog:
+        prog.addProgress(len(keys))
+    return groups
+
+def mergeGroups(keylists, prog=None):
+    '''Return list of (key, [range of indexes or None for each source]) for each run of keys in the first source,
+       by merging sources which are already sorted by key.'''
+    pos = [0]*len(keylists)
+    ret = []
+    keys0 = keylists[0]
+    i = 0
+    while i < len(keys0):
+        key = keys0[i]
+        ranges = []
+        for s, keys in enumerate(keylists):
+            start = pos[s]
+            while start < len(keys) and keys[start] < key:
+                start += 1
+            end = start
+            while end < len(keys) and keys[end] == key:
+                end += 1
+            pos[s] = end
+            ranges.append(range(start, end) if end > start else None)
+        ret.append((key, ranges))
+        i = ranges[0].stop
+    if prog:
+        prog.addProgress(sum(len(keys) for keys in keylists))
+    return ret
+
+
 class SheetJoin(Sheet):
     'Column-wise join/merge. `jointype` constructor arg should be one of jointypes.'
 
@@ -70,58 +156,57 @@ class SheetJoin(Sheet):
         for i, c in enumerate(sheets[0].keyCols):
             self.addColumn(SubrowColumn(ColumnItem(c.name, i), 0))
         self.nKeys = sheets[0].nKeys
+        for sheetnum, vs in enumerate(sheets):
+            # subsequent elements are the rows from each source, in order of the source sheets
+            for c in vs.nonKeyVisibleCols:
+                self.addColumn(SubrowColumn(c, sheetnum+1))
+
+        rowsBySheet, keysBySheet, sortedBySheet = zip(*[joinKeys(vs) for vs in sheets])
+        groups = None
+        with Progress(total=sum(len(keys) for keys in keysBySheet)) as prog:
+            if self.jointype in ('inner', 'outer') and all(sortedBySheet):
+                with suppress(TypeError):  # keys of different sources not comparable
+                    groups = mergeGroups(keysBySheet, prog)
+            if groups is None:
+                groups = self.hashJoin(keysBySheet, prog)
 
-        rowsBySheetKey = {}
-        rowsByKey = {}
-
-        with Progress(total=sum(len(vs.rows) for vs in sheets)*2) as prog:
-            for vs in sheets:
-                # tally rows by keys for each sheet
-                rowsBySheetKey[vs] = collections.defaultdict(list)
-                for r in vs.rows:
-                    prog.addProgress(1)
-                    key = tuple(c.getTypedValue(r) for c in vs.keyCols)
-                    rowsBySheetKey[vs][key].append(r)
-
-            for sheetnum, vs in enumerate(sheets):
-                # subsequent elements are the rows from each source, in order of the source sheets
-                for c in vs.nonKeyVisibleCols:
-                    self.addColumn(SubrowColumn(c, sheetnum+1))
-                for r in vs.rows:
-                    prog.addProgress(1)
-                    key = tuple(c.getTypedValue(r) for c in vs.keyCols)
-                    if key not in rowsByKey: # gather for this key has not been done yet
-                        # multiplicative for non-unique keys
-                        rowsByKey[key] = []
-                        for crow in itertools.product(*[rowsBySheetKey[vs2].get(key, [None]) for vs2 in sheets]):
-                            rowsByKey[key].append([key] + list(crow))
-
-        self.rows = []
-
-        with Progress(total=len(rowsByKey)) as prog:
-            for k, combinedRows in rowsByKey.items():
-                prog.addProgress(1)
-
-                if self.jointype == 'full':  # keep all rows from all sheets
-                    for combinedRow in combinedRows:
-                        self.addRow(combinedRow)
-
-                elif self.jointype == 'inner':  # only rows with matching key on all sheets
-                    for combinedRow in combinedRows:
-                        if all(combinedRow):
-                            self.addRow(combinedRow)
-
-                elif self.jointype == 'outer':  # all rows from first sheet
-                    for combinedRow in combinedRows:
-                        if combinedRow[1]:
-                            self.addRow(combinedRow)
-
-                elif self.jointype == 'diff':  # only rows without matching key on all sheets
-                    for combinedRow in combinedRows:
-                        if not all(combinedRow):
-                            self.addRow(combinedRow)
+        if self.jointype == 'full':  # keep all rows from all sheets
+            keep = lambda key, idxslist: True
+        elif self.jointype == 'inner':  # only rows with matching key on all sheets
+            keep = lambda key, idxslist: key and all(idxs is not None for idxs in idxslist)
+        elif self.jointype == 'outer':  # all rows from first sheet
+            keep = lambda key, idxslist: idxslist[0] is not None
+        elif self.jointype == 'diff':  # only rows without matching key on all sheets
+            keep = lambda key, idxslist: not (key and all(idxs is not None for idxs in idxslist))
+
+        self.rows = JoinRows(self, rowsBySheet, [g for g in Progress(groups) if keep(*g)])
+
+    def hashJoin(self, keysBySheet, prog):
+        '''Return list of (key, [array of indexes or None for each source]), for keys in order of first appearance.
+           For inner joins, only the smallest source is hashed in full; each larger one keeps only the keys found so far.'''
+        n = len(keysBySheet)
+        groupsBySheet = [None]*n
+        if self.jointype == 'inner':
+            only = None
+            for s in sorted(range(n), key=lambda s: len(keysBySheet[s])):
+                groupsBySheet[s] = only = hashGroups(keysBySheet[s], only, prog)
+            keyorder = [k for k in groupsBySheet[0] if all(k in g for g in groupsBySheet)]
+        elif self.jointype == 'outer':
+            groupsBySheet[0] = hashGroups(keysBySheet[0], None, prog)
+            for s in range(1, n):
+                groupsBySheet[s] = hashGroups(keysBySheet[s], groupsBySheet[0], prog)
+            keyorder = list(groupsBySheet[0])
+        else:
+            groupsBySheet = [hashGroups(keys, None, prog) for keys in keysBySheet]
+            keyorder = collections.OrderedDict()
+            for g in groupsBySheet:
+                keyorder.update((k, None) for k in g)
+
+        return [(key, [g.get(key) for g in groupsBySheet]) for key in keyorder]
 
 class ColumnConcat(Column):
+    cacheTypedVector = False  # rows are from the source sheets, which can be changed there
+
     def __init__(self, name, colsBySheet, **kwargs):
         super().__init__(name, **kwargs)
         self.colsBySheet = colsBySheet
@@ -137,17 +222,33 @@ class ColumnConcat(Column):
         srcCol = self.colsBySheet.get(srcSheet, None)
         if srcCol:
             srcCol.setValue(srcRow, v)
+            self.invalidateRow(row)
         else:
             error('column not on source sheet')
 
+class ConcatRows(VirtualRows):
+    'Rows of all `sheets` one after the other, as [sheet, row], computed on demand from the source rows as of creation.'
+    def __init__(self, vs, sheets):
+        super().__init__(vs)
+        self.sourceRows = [(sheet, sheet.rows) for sheet in sheets]
+        self.offsets = array('Q', [0])  # index of the first row of each source, then the total
+        for sheet, rows in self.sourceRows:
+            self.offsets.append(self.offsets[-1]+len(rows))
+
+    def nRows(self):
+        return self.offsets[-1]
+
+    def calcRow(self, i):
+        s = bisect.bisect_right(self.offsets, i)-1
+        sheet, rows = self.sourceRows[s]
+        return VirtualRow([sheet, rows[i-self.offsets[s]]])
+
+
 # rowdef: (Sheet, row)
 class SheetConcat(Sheet):
     'combination of multiple sheets by row concatenation'
     def reload(self):
-        self.rows = []
-        for sheet in self.sources:
-            for r in sheet.rows:
-                self.addRow((sheet, r))
+        self.rows = ConcatRows(self, self.sources)
 
         self.columns = []
         allColumns = {}
@@ -0,0 +1,86 @@
+import io
+import csv
+import multiprocessing
+
+from .vdtui import *
+
+option('load_processes', 0, 'number of processes for parsing large .tsv/.csv files (0 to parse serially)')
+option('load_chunk_size', 16*1024*1024, 'size in bytes of each chunk for parallel parsing')
+
+
+def canLoadChunked(p):
+    'True if Path `p` is an uncompressed file with \\n line endings, large enough to parse in parallel chunks.'
+    if options.load_processes <= 0 or isinstance(p, PathFd) or p.gzip_compressed:
+        return False
+    if not p.stat() or p.filesize < options.load_chunk_size*2:
+        return False
+    with open(p.resolve(), 'rb') as fp:
+        return b'\n' in fp.read(65536)
+
+def lineOffset(p, nlines, skipEmpty=False):
+    'Return the byte offset in Path `p` after its first `nlines` lines (not counting empty lines if `skipEmpty`).'
+    with open(p.resolve(), 'rb') as fp:
+        while nlines > 0:
+            L = fp.readline()
+            if not L:
+                break
+            if not skipEmpty or L.rstrip(b'\r\n'):
+                nlines -= 1
+        return fp.tell()
+
+def chunkRanges(p, start):
+    'Generate (start, end) byte ranges from `start` to the end of Path `p`, each ending just after a newline.'
+    size = p.filesize
+    with open(p.resolve(), 'rb') as fp:
+        while start < size:
+            fp.seek(min(start+options.load_chunk_size, size))
+            fp.readline()
+            end = min(fp.tell(), size)
+            yield start, end
+            start = end
+
+def _readChunk(fn, start, end, encoding, errors):
+    with open(fn, 'rb') as fp:
+        fp.seek(start)
+        data = fp.read(end-start)
+    return io.TextIOWrapper(io.BytesIO(data), encoding=encoding, errors=errors)
+
+def parseTsvChunk(args):
+    'Return list of rows for one chunk, as by reload_tsv_sync.  Runs in a worker process.'
+    fn, start, end, encoding, errors, delim = args
+    rows = []
+    for L in _readChunk(fn, start, end, encoding, errors):
+        L = L[:-1]
+        if L:
+            rows.append(L.split(delim))
+    return rows
+
+def parseCsvChunk(args):
+    '''Return list of rows for one chunk, or None if any record spans more than one line.  Runs in a worker process.
+       A quoted field left open at the end of the chunk (continued in the next one) is an error with strict=True.'''
+    fn, start, end, encoding, errors, csvargs = args
+    rows = []
+    rdr = csv.reader(_readChunk(fn, start, end, encoding, errors), **dict(csvargs, strict=True))
+    try:
+        for r in rdr:
+            rows.append(r)
+            if rdr.line_num != len(rows):  # quoted newline
+                return None
+    except csv.Error:
+        return None
+    return rows
+
+def loadChunked(vs, parsefunc, start, addRow, *args):
+    '''Parse the source of `vs` from byte offset `start` in chunks over a process pool, calling `addRow` for each row in order.
+       Return False if a chunk could not be parsed on its own.'''
+    p = vs.source
+    tasks = [(p.resolve(), s, e, options.encoding, options.encoding_errors) + args for s, e in chunkRanges(p, start)]
+    with multiprocessing.Pool(options.load_processes) as pool:
+        with Progress(total=p.filesize-start) as prog:
+            for task, rows in zip(tasks, pool.imap(parsefunc, tasks)):
+                if rows is None:
+                    return False
+                for r in rows:
+                    addRow(r)
+                prog.addProgress(task[2]-task[1])
+    return True
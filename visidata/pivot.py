@@ -2,14 +2,14 @@ from visidata import *
 
 globalCommand('W', 'vd.push(SheetPivot(sheet, [cursorCol]))', 'Pivot the current column into a new sheet')
 
-# rowdef: (tuple(keyvalues), dict(variable_value -> list(rows)))
+# rowdef: (tuple(keyvalues), dict(variable_value -> IndexedRows), IndexedRows of all rows for keyvalues, dict(aggkey -> aggregate value))
 class SheetPivot(Sheet):
     'Summarize key columns in pivot table and display as new sheet.'
     rowtype = 'aggregated rows'
     commands = [
-        Command('z'+ENTER, 'vs=copy(source); vs.name+="_%s"%cursorCol.aggvalue; vs.rows=cursorRow[1].get(cursorCol.aggvalue, []); vd.push(vs)',
+        Command('z'+ENTER, 'vs=copy(source); vs.name+="_%s"%cursorCol.aggvalue; vs.rows=list(cursorRow[1].get(cursorCol.aggvalue, [])); vd.push(vs)',
                       'push sheet of source rows aggregated in this cell'),
-        Command(ENTER, 'vs=copy(source); vs.name+="_%s"%"+".join(cursorRow[0]); vs.rows=sum(cursorRow[1].values(), []); vd.push(vs)',
+        Command(ENTER, 'vs=copy(source); vs.name+="_%s"%"+".join(cursorRow[0]); vs.rows=list(cursorRow[2]); vd.push(vs)',
                       'push sheet of source rows aggregated in this cell')
                ]
     def __init__(self, srcsheet, variableCols):
@@ -24,62 +24,110 @@ class SheetPivot(Sheet):
                 self.nonpivotKeyCols.append(newcol)
 
 
+    @async
     def reload(self):
-        # two different threads for better interactive display
-        self.reloadCols()
-        self.reloadRows()
+        'Group source rows by key and variable values, aggregating each bin as it goes, in one pass.'
+        tvs = [col.getTypedVector(self.source.rows) for col in self.variableCols]
+        rows = tvs[0].rows if tvs else list(self.source.rows)
+        n = len(rows)
+        keyvecs = [keycol.srccol.getTypedVector(rows).values for keycol in self.nonpivotKeyCols]
 
-    @async
-    def reloadCols(self):
-        self.columns = copy(self.nonpivotKeyCols)
-        self.nKeys = len(self.nonpivotKeyCols)
         aggcols = [(c, aggregator) for c in self.source.columns for aggregator in getattr(c, 'aggregators', [])]
-
         if not aggcols:
             aggcols = [(c, aggregators["count"]) for c in self.variableCols]
 
-        for col in self.variableCols:
+        aggrsByCol = collections.OrderedDict()  # [aggcol] -> list of aggregators, to evaluate together
+        for aggcol, aggregator in aggcols:
+            aggrsByCol.setdefault(aggcol, []).append(aggregator)
+        fusedByCol = [(aggcol, [a for a in aggrs if a.fused]) for aggcol, aggrs in aggrsByCol.items()]
+        aggvecs = [aggcol.getTypedVector(rows) for aggcol in aggrsByCol]
+
+        def initStates():
+            return [[a.init() for a in fused] for aggcol, fused in fusedByCol]
+
+        groups = collections.OrderedDict()   # [keys] -> (keys, {varval: idxs}, idxs, {varval: states of each aggcol})
+        allValues = [collections.OrderedDict() for tv in tvs]  # valid values of each variable column, in order of appearance
+        with Progress(total=n) as prog:
+            for i in range(n):
+                keys = tuple(vec[i] for vec in keyvecs)
+                g = groups.get(keys)
+                if g is None:
+                    g = groups[keys] = (keys, {}, indexArray(n), {})
+                g[2].append(i)
+
+                for tv, values in zip(tvs, allValues):
+                    varval = tv.values[i]
+                    idxs = g[1].get(varval)
+                    if idxs is None:
+                        idxs = g[1][varval] = indexArray(n)
+                        g[3][varval] = initStates()
+                    idxs.append(i)
+                    if not tv.errors[i] and not tv.nulls[i]:
+                        values[varval] = None
+
+                    for (aggcol, fused), vec, states in zip(fusedByCol, aggvecs, g[3][varval]):
+                        if not vec.errors[i] and not vec.nulls[i]:
+                            updateStates(fused, states, vec.values[i], rows[i])
+                prog.addProgress(1)
+
+        # cells of values which are not in a group have the aggregates of no rows
+        emptyCells = {}
+        for aggcol, aggrs in aggrsByCol.items():
+            for aggregator, result in zip(aggrs, aggregateValues(aggcol, aggrs, [])):
+                emptyCells[(aggcol, aggregator)] = result
+
+        columns = copy(self.nonpivotKeyCols)
+        for col, values in zip(self.variableCols, allValues):
             for aggcol, aggregator in aggcols:
                 aggname = '%s_%s' % (aggcol.name, aggregator.__name__)
                 if aggregator.__name__ != 'count':  # already have count above
-                    c = Column('Total_' + aggname,
-                                type=aggregator.type or aggcol.type,
-                                getter=lambda col,row,aggcol=aggcol: aggregator(aggcol, sum(row[1].values(), [])))
-                    self.addColumn(c)
-
-                allValues = set()
-                for value in Progress(col.getValues(self.source.rows), total=len(self.source.rows)):
-                    if value not in allValues:
-                        allValues.add(value)
-                        c = Column(value+'_'+aggname,
-                                type=aggregator.type or aggcol.type,
-                                getter=lambda col,row,aggcol=aggcol,aggvalue=value: aggregator(aggcol, row[1].get(aggvalue, [])))
-                        c.aggvalue = value
-                        self.addColumn(c)
-
-            c = Column('Total_count',
-                        type=int,
-                        getter=lambda col,row: len(sum(row[1].values(), [])))
-            self.addColumn(c)
+                    c = Column('Total_' + aggname, type=aggregator.type or aggcol.type, getter=lambda col,row: pivotCell(row, col.aggkey, col.emptyCell))
+                    c.aggkey = (aggcol, aggregator, None)
+                    c.emptyCell = None
+                    columns.append(c)
 
+                for value in values:
+                    c = Column('%s_%s' % (value, aggname), type=aggregator.type or aggcol.type, getter=lambda col,row: pivotCell(row, col.aggkey, col.emptyCell))
+                    c.aggvalue = value
+                    c.aggkey = (aggcol, aggregator, value)
+                    c.emptyCell = emptyCells[(aggcol, aggregator)]
+                    columns.append(c)
 
-    @async
-    def reloadRows(self):
-        rowidx = {}
-        self.rows = []
-        for r in Progress(self.source.rows):
-            keys = tuple(keycol.srccol.getTypedValue(r) for keycol in self.nonpivotKeyCols)
-
-            pivotrow = rowidx.get(keys)
-            if pivotrow is None:
-                pivotrow = (keys, {})
-                rowidx[keys] = pivotrow
-                self.addRow(pivotrow)
-
-            for col in self.variableCols:
-                varval = col.getTypedValue(r)
-                matchingRows = pivotrow[1].get(varval)
-                if matchingRows is None:
-                    pivotrow[1][varval] = [r]
+            columns.append(Column('Total_count', type=int, getter=lambda col,row: len(row[2])))
+
+        pivotrows = []
+        for keys, bins, idxs, binStates in Progress(groups.values()):
+            row = (keys, {v: IndexedRows(rows, b) for v, b in bins.items()}, IndexedRows(rows, idxs), {})
+            cells = row[3]
+            for k, ((aggcol, fused), aggrs) in enumerate(zip(fusedByCol, aggrsByCol.values())):
+                nonfused = [a for a in aggrs if not a.fused]
+                totals = None
+                for value, states in binStates.items():
+                    for aggregator, result in zip(fused, finalizeStates(aggcol, fused, states[k])):
+                        cells[(aggcol, aggregator, value)] = result
+                    if nonfused:
+                        for aggregator, result in zip(nonfused, aggregateValues(aggcol, nonfused, row[1][value])):
+                            cells[(aggcol, aggregator, value)] = result
+
+                if len(tvs) == 1:  # the bins of the variable column partition the group
+                    for states in binStates.values():
+                        totals = states[k] if totals is None else mergeStates(fused, totals, states[k])
                 else:
-                    matchingRows.append(r)
+                    totals = partialStates(aggcol, fused, row[2])
+                for aggregator, result in zip(fused, finalizeStates(aggcol, fused, totals)):
+                    cells[(aggcol, aggregator, None)] = result
+                for aggregator, result in zip(nonfused, aggregateValues(aggcol, nonfused, row[2])):
+                    cells[(aggcol, aggregator, None)] = result
+            pivotrows.append(row)
+
+        self.columns = columns
+        self.nKeys = len(self.nonpivotKeyCols)
+        self.rows = pivotrows
+
+
+def pivotCell(row, aggkey, emptyCell):
+    'Return the aggregate computed at reload for the cell at `aggkey` (or `emptyCell` if there are no rows for it), raising its exception if it failed.'
+    v = row[3].get(aggkey, emptyCell)
+    if isinstance(v, Exception):
+        raise v
+    return v
@@ -71,6 +71,7 @@ def SheetList(name, src, **kwargs):
 
 class ListOfPyobjSheet(Sheet):
     rowtype = 'python objects'
+    cacheCells = False
     commands = [Command(ENTER, 'pyobj-dive')]
     def reload(self):
         self.rows = self.source
@@ -81,6 +82,7 @@ class ListOfPyobjSheet(Sheet):
 # rowdef: dict
 class ListOfDictSheet(Sheet):
     rowtype = 'dicts'
+    cacheCells = False
     commands = [Command(ENTER, 'pyobj-dive')]
     def reload(self):
         self.columns = DictKeyColumns(self.source[0])
@@ -89,6 +91,7 @@ class ListOfDictSheet(Sheet):
 # rowdef: namedtuple
 class ListOfNamedTupleSheet(Sheet):
     rowtype = 'namedtuples'
+    cacheCells = False
     commands = [Command(ENTER, 'pyobj-dive')]
     def reload(self):
         self.columns = [ColumnItem(k, i) for i, k in enumerate(self.source[0]._fields)]
@@ -98,6 +101,7 @@ class ListOfNamedTupleSheet(Sheet):
 # rowdef: PyObj
 class SheetNamedTuple(Sheet):
     rowtype = 'values'
+    cacheCells = False
     'a single namedtuple, with key and value columns'
     commands = [Command(ENTER, 'dive()', 'dive further into Python object')]
     columns = [ColumnItem('name', 0), ColumnItem('value', 1)]
@@ -114,6 +118,7 @@ class SheetNamedTuple(Sheet):
 
 class SheetDict(Sheet):
     rowtype = 'items'
+    cacheCells = False
     commands = [
         Command('e', 'edit()', 'edit contents of current cell'),
         Command(ENTER, 'dive()', 'dive further into Python object')
@@ -144,6 +149,7 @@ class ColumnSourceAttr(Column):
 # rowdef: attrname
 class SheetObject(Sheet):
     rowtype = 'attributes'
+    cacheCells = False
     commands = [
         Command(ENTER, 'v = getattr(source, cursorRow); push_pyobj(joinSheetnames(name, cursorRow), v() if callable(v) else v)', 'dive further into Python object'),
         Command('e', 'setattr(source, cursorRow, editCell(1)); sheet.cursorRowIndex += 1; reload()', 'edit contents of current cell'),
@@ -0,0 +1,140 @@
+import math
+import statistics
+
+from .vdtui import *
+
+
+class RunningStats:
+    "Count, mean and sample standard deviation in one pass, by Welford's algorithm."
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta/self.n
+        self.m2 += delta*(x - self.mean)
+
+    def getMean(self):
+        if self.n < 1:
+            raise statistics.StatisticsError('mean requires at least one data point')
+        return self.mean
+
+    def getStdev(self):
+        if self.n < 2:
+            raise statistics.StatisticsError('variance requires at least two data points')
+        return math.sqrt(self.m2/(self.n-1))
+
+
+class P2Quantile:
+    'Estimate of quantile `p` (0.5 for the median) in constant memory, by the P-square algorithm of Jain and Chlamtac.'
+    def __init__(self, p=0.5):
+        self.p = p
+        self.q = []                    # marker heights; the first 5 values until there are 5
+        self.npos = [1, 2, 3, 4, 5]    # actual marker positions
+        self.desired = [1, 1+2*p, 1+4*p, 3+2*p, 5]
+        self.incr = [0, p/2, p, (1+p)/2, 1]
+
+    def add(self, x):
+        q = self.q
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k+1]:
+                k += 1
+
+        npos = self.npos
+        for i in range(k+1, 5):
+            npos[i] += 1
+        for i in range(5):
+            self.desired[i] += self.incr[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - npos[i]
+            if (d >= 1 and npos[i+1]-npos[i] > 1) or (d <= -1 and npos[i-1]-npos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = self.parabolic(i, d)
+                if not q[i-1] < qp < q[i+1]:
+                    qp = q[i] + d*(q[i+d]-q[i])/(npos[i+d]-npos[i])
+                q[i] = qp
+                npos[i] += d
+
+    def parabolic(self, i, d):
+        q, n = self.q, self.npos
+        return q[i] + d/(n[i+1]-n[i-1]) * ((n[i]-n[i-1]+d)*(q[i+1]-q[i])/(n[i+1]-n[i]) + (n[i+1]-n[i]-d)*(q[i]-q[i-1])/(n[i]-n[i-1]))
+
+    def value(self):
+        if not self.q:
+            raise statistics.StatisticsError('no median for empty data')
+        if len(self.q) < 5:
+            return statistics.median(self.q)
+        return self.q[2]
+
+
+def _mix64(h):
+    'splitmix64 finalizer, to spread the bits of hash() (which is the identity for small ints)'
+    h &= 0xffffffffffffffff
+    h = ((h ^ (h >> 30)) * 0xbf58476d1ce4e5b9) & 0xffffffffffffffff
+    h = ((h ^ (h >> 27)) * 0x94d049bb133111eb) & 0xffffffffffffffff
+    return h ^ (h >> 31)
+
+
+class HyperLogLog:
+    'Estimate of the number of distinct hashable values, within about 1% using 2**`p` bytes.'
+    def __init__(self, p=14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, v):
+        h = _mix64(hash(v))
+        j = h >> (64-self.p)
+        w = h & ((1 << (64-self.p)) - 1)
+        rank = (64-self.p) - w.bit_length() + 1
+        if rank > self.registers[j]:
+            self.registers[j] = rank
+
+    def __len__(self):
+        m = self.m
+        alpha = 0.7213/(1 + 1.079/m)
+        est = alpha*m*m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if est <= 2.5*m and zeros:
+            est = m*math.log(m/zeros)  # linear counting for small cardinalities
+        return int(round(est))
+
+
+class HeavyHitters:
+    'Most frequent value in bounded memory, by the Misra-Gries summary with `k` counters; exact if there are fewer than `k` distinct values.'
+    def __init__(self, k=1000):
+        self.k = k
+        self.counts = {}
+
+    def add(self, v):
+        counts = self.counts
+        if v in counts:
+            counts[v] += 1
+        elif len(counts) < self.k:
+            counts[v] = 1
+        else:
+            for key in list(counts):
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+
+    def mode(self):
+        if not self.counts:
+            raise statistics.StatisticsError('no mode for empty data')
+        return max(self.counts.items(), key=lambda kv: kv[1])[0]
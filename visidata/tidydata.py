@@ -1,3 +1,6 @@
+import bisect
+from array import array
+
 from visidata import *
 
 globalCommand('M', 'vd.push(MeltedSheet(sheet))', 'open melted sheet (unpivot)')
@@ -5,6 +8,36 @@ globalCommand('M', 'vd.push(MeltedSheet(sheet))', 'open melted sheet (unpivot)')
 melt_var_colname = 'Variable' # column name to use for the melted variable name
 melt_value_colname = 'Value'  # column name to use for the melted value
 
+class MeltedRows(VirtualRows):
+    '''Rows of [sourceRow, sourceCol] for the non-null cells of `cols` in `rows`, computed on demand from a sparse index.
+       The index is built by indexCells, and the rows grow as it goes.'''
+    def __init__(self, sheet, rows, cols):
+        super().__init__(sheet)
+        self.sourceRows = rows
+        self.cols = cols
+        self.offsets = array('Q', [0])  # index of the first melted row of each source row, then the total
+        self.sparse = {}   # [sourceRowIdx] -> array of indexes into cols, for source rows with any null cells
+        self.typecode = 'H' if len(cols) < 2**16 else 'I'
+
+    def nRows(self):
+        return self.offsets[-1]
+
+    def indexCells(self):
+        'Index the non-null cells of each source row.'
+        cols = self.cols
+        for i, r in enumerate(Progress(self.sourceRows)):
+            colidxs = [j for j, c in enumerate(cols) if c.getValue(r) is not None]
+            if len(colidxs) < len(cols):
+                self.sparse[i] = array(self.typecode, colidxs)
+            self.offsets.append(self.offsets[-1]+len(colidxs))
+
+    def calcRow(self, i):
+        ri = bisect.bisect_right(self.offsets, i)-1
+        j = i - self.offsets[ri]
+        colidxs = self.sparse.get(ri)
+        return VirtualRow([self.sourceRows[ri], self.cols[j if colidxs is None else colidxs[j]]])
+
+
 # rowdef: (sourceRow, sourceCol)
 class MeltedSheet(Sheet):
     "Perform 'melt', the reverse of 'pivot', on input sheet."
@@ -22,8 +55,5 @@ class MeltedSheet(Sheet):
 
         colsToMelt = [copy(c) for c in sheet.nonKeyVisibleCols]
 
-        self.rows = []
-        for r in Progress(self.source.rows):
-            for c in colsToMelt:
-                if c.getValue(r) is not None:
-                    self.addRow((r, c))
+        self.rows = MeltedRows(self, self.source.rows, colsToMelt)
+        self.rows.indexCells()
@@ -41,13 +41,17 @@ import curses
 import datetime
 import functools
 import io
+import heapq
+import bisect
 import itertools
+import operator
 import string
 import re
 import textwrap
 import threading
 import traceback
 import time
+import weakref
 
 class EscapeException(BaseException):
     'Inherits from BaseException to avoid "except Exception" clauses.  Do not use a blanket "except:" or the task will be uncancelable.'
@@ -61,6 +65,14 @@ class Command:
         self.name = name
         self.execstr = execstr
         self.helpstr = helpstr
+        self._code = None  # (execstr, code object) as last compiled
+
+    @property
+    def code(self):
+        'execstr compiled for exec(), recompiled only if execstr has changed'
+        if self._code is None or self._code[0] != self.execstr:
+            self._code = (self.execstr, compile(self.execstr, '<command %s>' % self.name, 'exec'))
+        return self._code[1]
 
 def globalCommand(keystrokes, execstr, helpstr='', longname=None):
     if isinstance(keystrokes, str):
@@ -78,10 +90,23 @@ def option(name, default, helpstr=''):
     baseOptions[name] = [name, default, default, helpstr]
 
 
+class OptionsSnapshot:
+    'Read-only copy of all option values, as from options.snapshot().'
+    def __init__(self, opts, version):
+        self.__dict__.update((k, v[1]) for k, v in opts.items())
+        self.__dict__['_version'] = version
+
+    def __setattr__(self, k, v):
+        raise AttributeError('options snapshot is read-only')
+
+
 class OptionsObject:
     'minimalist options framework'
     def __init__(self, d):
         object.__setattr__(self, '_opts', d)
+        object.__setattr__(self, '_version', 0)  # incremented on every change
+        object.__setattr__(self, '_snapshot', None)
+        object.__setattr__(self, '_subscribers', collections.defaultdict(list))  # [optname or None] -> list of func(optname, value)
 
     def __getattr__(self, k):      # options.foo
         name, value, default, helpstr = self._opts[k]
@@ -102,6 +127,39 @@ class OptionsObject:
             v = t(v)
 
         self._opts[k][1] = v
+        object.__setattr__(self, '_version', self._version+1)
+
+        for func in self._subscribers[k] + self._subscribers[None]:
+            func(k, v)
+
+    def snapshot(self):
+        'Return OptionsSnapshot of current values, for hot loops; the same snapshot is returned until an option changes.'
+        snap = self._snapshot
+        if snap is None or snap._version != self._version or len(snap.__dict__) != len(self._opts)+1:
+            snap = OptionsSnapshot(self._opts, self._version)
+            object.__setattr__(self, '_snapshot', snap)
+        return snap
+
+    def subscribe(self, func, *optnames):
+        'Call func(optname, value) after any of the given options (or any option at all, if none given) is set.'
+        for k in optnames or [None]:
+            self._subscribers[k].append(func)
+
+
+def optionsCached(*optnames):
+    'Decorator for function of no arguments, to reuse its result until any of the given options is set.'
+    def decorator(func):
+        cache = []
+        options.subscribe(lambda k, v: cache.clear(), *optnames)
+
+        @functools.wraps(func)
+        def _cached():
+            if not cache:
+                cache.append(func())
+            return cache[0]
+        return _cached
+    return decorator
+
 
 options = OptionsObject(baseOptions)
 
@@ -168,10 +226,15 @@ theme('color_format_exc', '48 bold yellow', 'color of formatting exception note'
 theme('color_getter_exc', 'red bold', 'color of computation exception note')
 theme('scroll_incr', 3, 'amount to scroll with scrollwheel')
 
+option('col_cache_policy', 'lru', 'default policy for column caches (lru, lfu, or full)')
+option('col_cache_size', 256, 'max number of values kept in each lru/lfu column cache')
+option('col_cache_budget_mb', 256, 'max approximate size in MB of values kept in all column caches')
+option('undo_max', 100000, 'max number of changed cells and rows to keep in the undo journal')
+
 ENTER='^J'
 ESC='^['
 globalCommand('KEY_RESIZE', '', 'no-op by default')
-globalCommand('q',  'vd.sheets.pop(0)', 'quit current sheet')
+globalCommand('q',  'vd.quit(sheet)', 'quit current sheet')
 
 globalCommand('KEY_LEFT',  'cursorRight(-1)', 'move one column left',  'move-left')
 globalCommand('KEY_DOWN',  'cursorDown(+1)',  'move one row down',     'move-down')
@@ -229,6 +292,7 @@ globalCommand('[', 'orderBy(cursorCol)', 'sort ascending by current column', 'so
 globalCommand(']', 'orderBy(cursorCol, reverse=True)', 'sort descending by current column', 'sort-curcol-desc')
 globalCommand('g[', 'orderBy(*keyCols)', 'sort ascending by all key columns', 'sort-keycols-asc')
 globalCommand('g]', 'orderBy(*keyCols, reverse=True)', 'sort descending by all key columns', 'sort-keycols-desc')
+globalCommand('z[', 'orderBy(*keyCols, reverse=sortDirections(input("sort key columns (+ asc, - desc): ", value="+"*len(keyCols))))', 'sort by all key columns, ascending or descending for each as given', 'sort-keycols-input')
 
 globalCommand('^E', 'vd.lastErrors and vd.push(TextSheet("last_error", vd.lastErrors[-1])) or status("no error")', 'view traceback for most recent error')
 globalCommand('z^E', 'vd.push(TextSheet("cell_error", getattr(cursorCell, "error", None) or error("no error this cell")))', 'view traceback for error in current cell')
@@ -239,7 +303,7 @@ globalCommand('^^', 'vd.sheets[0], vd.sheets[1] = vd.sheets[1], vd.sheets[0]', '
 globalCommand('g^E', 'vd.push(TextSheet("last_errors", sum(vd.lastErrors[-10:], [])))', 'view traceback for most recent errors')
 
 globalCommand('^R', 'reload(); recalc(); status("reloaded")', 'reload current sheet')
-globalCommand('z^R', 'cursorCol._cachedValues.clear()', 'clear cache for current column')
+globalCommand('z^R', 'cursorCol.clearCache()', 'clear cache for current column')
 
 globalCommand('/', 'moveRegex(sheet, regex=input("/", type="regex"), columns="cursorCol", backward=False)', 'search for regex forwards in current column')
 globalCommand('?', 'moveRegex(sheet, regex=input("?", type="regex"), columns="cursorCol", backward=True)', 'search for regex backwards in current column')
@@ -265,7 +329,7 @@ globalCommand('\\', 'unselectByIdx(vd.searchRegex(sheet, regex=input("\\\\", typ
 
 globalCommand('gt', 'toggle(rows)', 'toggle selection of all rows')
 globalCommand('gs', 'select(rows)', 'select all rows')
-globalCommand('gu', '_selectedRows.clear()', 'unselect all rows')
+globalCommand('gu', '_selection.clear()', 'unselect all rows')
 
 globalCommand('g|', 'selectByIdx(vd.searchRegex(sheet, regex=input("g|", type="regex"), columns="visibleCols"))', 'select rows matching regex in any visible column')
 globalCommand('g\\', 'unselectByIdx(vd.searchRegex(sheet, regex=input("g\\\\", type="regex"), columns="visibleCols"))', 'unselect rows matching regex in any visible column')
@@ -275,7 +339,7 @@ globalCommand('g,', 'select(gatherBy(lambda r,v=cursorRow: r == v), progress=Fal
 
 globalCommand('"', 'vs = copy(sheet); vs.name += "_selectedref"; vs.rows = list(selectedRows or rows); vs.select(vs.rows); vd.push(vs)', 'open duplicate sheet with only selected rows')
 globalCommand('g"', 'vs = copy(sheet); vs.name += "_copy"; vs.rows = list(rows); vs.select(selectedRows); vd.push(vs)', 'open duplicate sheet with all rows')
-globalCommand('gz"', 'vs = deepcopy(sheet); vs.name += "_selectedcopy"; vs.rows = async_deepcopy(vs, selectedRows or rows); vd.push(vs); status("pushed sheet with async deepcopy of all rows")', 'open duplicate sheet with all rows')
+globalCommand('gz"', 'vs = deepcopy(sheet); vs.name += "_selectedcopy"; vs.rows = shareRows(selectedRows or rows, sheet, vs); vd.push(vs); status("pushed sheet with copy-on-write rows")', 'open duplicate sheet with all rows')
 
 globalCommand('=', 'addColumn(ColumnExpr(input("new column expr=", "expr")), index=cursorColIndex+1)', 'create new column from Python expression, with column names as variables')
 globalCommand('g=', 'cursorCol.setValuesFromExpr(selectedRows or rows, input("set selected=", "expr"))', 'set current column for selected rows to result of Python expression')
@@ -421,6 +485,7 @@ def chooseOne(choices):
     else:
         return input('/'.join(str(x) for x in choices) + ': ', completer=choiceCompleter)
 
+@optionsCached('regex_flags')
 def regex_flags():
     'Return flags to pass to regex functions from options'
     return sum(getattr(re, f.upper()) for f in options.regex_flags)
@@ -428,15 +493,43 @@ def regex_flags():
 def moveRegex(sheet, *args, **kwargs):
     list(vd().searchRegex(sheet, *args, moveCursor=True, **kwargs))
 
-def sync(expectedThreads=0):
-    vd().sync(expectedThreads)
+def sync(expectedThreads=0, timeout=None):
+    return vd().sync(expectedThreads, timeout)
 
 def async(func):
-    'Function decorator, to make calls to `func()` spawn a separate thread if available.'
+    'Function decorator, to make calls to `func()` spawn a separate thread if available, and return its Task.'
     def _execAsync(*args, **kwargs):
         return vd().execAsync(func, *args, **kwargs)
     return _execAsync
 
+class Task(threading.Thread):
+    'Thread for an @async call, which is also a future-like handle to wait for it to finish.'
+    def __init__(self, func, *args, **kwargs):
+        super().__init__(daemon=True)
+        self.call = (func, args, kwargs)
+        self.finished = threading.Event()
+        self.ret = None
+
+    def run(self):
+        try:
+            func, args, kwargs = self.call
+            self.ret = func(*args, **kwargs)
+        finally:
+            vd().taskFinished(self)
+
+    def done(self):
+        return self.finished.is_set()
+
+    def wait(self, timeout=None):
+        'Wait for the task to finish, for up to `timeout` seconds.  Return True if it has finished.'
+        return self.finished.wait(timeout)
+
+    def result(self, timeout=None):
+        'Return the result of the task, after waiting for it to finish.  Raise TimeoutError if it does not finish within `timeout` seconds.'
+        if not self.finished.wait(timeout):
+            raise TimeoutError('%s did not finish within %ss' % (self.name, timeout))
+        return self.ret
+
 class Progress:
     def __init__(self, iterable=None, total=None, sheet=None):
         self.iterable = iterable
@@ -489,6 +582,11 @@ class VisiData:
         self.scr = None  # curses scr
         self.hooks = collections.defaultdict(list)  # [hookname] -> list(hooks)
         self.threads = [] # all long-running threads, including main and finished
+        self.taskCondition = threading.Condition()  # notified by each Task when it finishes
+        self.finishedTasks = []  # Tasks finished since the last checkForFinishedThreads
+        self.cellVersion = 0  # incremented when any drawn cell may have changed (edits, reloads)
+        self.sharedRows = SharedRows()  # rows held by more than one sheet, copied on first change
+        self.journal = Journal()  # changes made by each command, for undo
         self.addThread(threading.current_thread(), endTime=0)
         self.addHook('rstatus', lambda sheet,self=self: (self.keystrokes, 'white'))
         self.addHook('rstatus', self.rightStatus)
@@ -525,10 +623,11 @@ class VisiData:
         'Execute `func(*args, **kwargs)` in a separate thread.'
 
         currentSheet = self.sheets[0]
-        thread = threading.Thread(target=self.toplevelTryFunc, daemon=True, args=(func,)+args, kwargs=kwargs)
+        thread = Task(self.toplevelTryFunc, func, *args, **kwargs)
         self.addThread(thread)
         currentSheet.currentThreads.append(thread)
         thread.sheet = currentSheet
+        thread.journalGroup = self.journal.activeGroup()  # changes in the thread are part of the command which started it
         thread.start()
         return thread
 
@@ -543,7 +642,9 @@ class VisiData:
             t.status += 'aborted by user'
             status('%s aborted' % t.name)
         except Exception as e:
-            t.status += status('%s: %s' % (type(e).__name__, ' '.join(str(x) for x in e.args)))
+            msg = '%s: %s' % (type(e).__name__, ' '.join(str(x) for x in e.args))
+            status(msg)  # may be replaced by a function without a return value, as in batch mode
+            t.status += msg
             exceptionCaught()
 
         t.sheet.currentThreads.remove(t)
@@ -554,18 +655,28 @@ class VisiData:
         'A list of unfinished threads (those without a recorded `endTime`).'
         return [t for t in self.threads if getattr(t, 'endTime', None) is None]
 
+    def taskFinished(self, t):
+        'Mark Task `t` with endTime, and notify those waiting on taskCondition.  Called by the task as it finishes.'
+        with self.taskCondition:
+            t.endTime = time.process_time()
+            self.cellVersion += 1  # cells may have been filled in by the task
+            self.finishedTasks.append(t)
+            t.finished.set()
+            self.taskCondition.notify_all()
+
     def checkForFinishedThreads(self):
-        'Mark terminated threads with endTime.'
-        for t in self.unfinishedThreads:
-            if not t.is_alive():
-                t.endTime = time.process_time()
-                if not getattr(t, 'status', None):
-                    t.status = 'ended'
-
-    def sync(self, expectedThreads=0):
-        'Wait for all but expectedThreads async tasks to finish.'
-        while len(self.unfinishedThreads) > expectedThreads:
-            self.checkForFinishedThreads()
+        'Set status of the tasks which have finished since the last call, and return them.'
+        with self.taskCondition:
+            finished, self.finishedTasks = self.finishedTasks, []
+        for t in finished:
+            if not getattr(t, 'status', None):
+                t.status = 'ended'
+        return finished
+
+    def sync(self, expectedThreads=0, timeout=None):
+        'Wait for all but expectedThreads async tasks to finish, for up to `timeout` seconds.  Return True if they have finished.'
+        with self.taskCondition:
+            return self.taskCondition.wait_for(lambda: len(self.unfinishedThreads) <= expectedThreads, timeout)
 
     def refresh(self):
         Sheet.visibleCols.fget.cache_clear()
@@ -622,12 +733,6 @@ class VisiData:
     # kwargs: regex=None, columns=None, backward=False
     def searchRegex(self, sheet, moveCursor=False, reverse=False, **kwargs):
         'Set row index if moveCursor, otherwise return list of row indexes.'
-        def findMatchingColumn(sheet, row, columns, func):
-            'Find column for which func matches the displayed value in this row'
-            for c in columns:
-                if func(c.getDisplayValue(row)):
-                    return c
-
         self.searchContext.update(kwargs)
 
         regex = kwargs.get("regex")
@@ -651,31 +756,29 @@ class VisiData:
         if reverse:
             searchBackward = not searchBackward
 
-        if searchBackward:
-            rng = range(sheet.cursorRowIndex-1, -1, -1)
-            rng2 = range(sheet.nRows-1, sheet.cursorRowIndex-1, -1)
-        else:
-            rng = range(sheet.cursorRowIndex+1, sheet.nRows)
-            rng2 = range(0, sheet.cursorRowIndex+1)
+        mi = sheet.matchIndex(regex, columns)
+        matchingRowIndexes = mi.rowIndexes()
 
-        matchingRowIndexes = 0
+        if moveCursor:
+            if matchingRowIndexes:
+                if searchBackward:
+                    i = bisect.bisect_left(matchingRowIndexes, sheet.cursorRowIndex)-1
+                    wrapped = i < 0
+                else:
+                    i = bisect.bisect_right(matchingRowIndexes, sheet.cursorRowIndex)
+                    wrapped = i >= len(matchingRowIndexes)
+                    if wrapped:
+                        i = 0
+                r = matchingRowIndexes[i]
+                sheet.cursorRowIndex = r
+                sheet.cursorVisibleColIndex = sheet.visibleCols.index(mi.matchingColumn(sheet.rows[r]))
+                if wrapped:
+                    status('search wrapped')
+                return
+        else:
+            yield from matchingRowIndexes
 
-        with Progress(total=sheet.nRows) as prog:
-            for r in itertools.chain(rng, rng2):
-                prog.addProgress(1)
-                c = findMatchingColumn(sheet, sheet.rows[r], columns, regex.search)
-                if c:
-                    if moveCursor:
-                        sheet.cursorRowIndex = r
-                        sheet.cursorVisibleColIndex = sheet.visibleCols.index(c)
-                        if r in rng2:
-                            status('search wrapped')
-                        return
-                    else:
-                        matchingRowIndexes += 1
-                        yield r
-
-        status('%s matches for /%s/' % (matchingRowIndexes, regex.pattern))
+        status('%s matches for /%s/' % (len(matchingRowIndexes), regex.pattern))
 
     def exceptionCaught(self, status=True):
         'Maintain list of most recent errors and return most recent one.'
@@ -814,6 +917,12 @@ class VisiData:
         self.sheets.pop(0)
         return self.push(vs)
 
+    def quit(self, vs):
+        'Remove sheet `vs` from the stack, and from the holders of shared rows.'
+        self.remove(vs)
+        if self.sharedRows.holders:
+            self.sharedRows.prune(self.sheets)
+
     def remove(self, vs):
         if vs in self.sheets:
             self.sheets.remove(vs)
@@ -823,6 +932,7 @@ class VisiData:
     def push(self, vs):
         'Move given sheet `vs` to index 0 of list `sheets`.'
         if vs:
+            self.journal.taint()
             vs.vd = self
             if vs in self.sheets:
                 self.sheets.remove(vs)
@@ -839,6 +949,8 @@ class VisiData:
 
 class LazyMap:
     'provides a lazy mapping to obj attributes.  useful when some attributes are expensive properties.'
+    classAttrs = {}  # [cls] -> set of attribute names of the class (including bases)
+
     def __init__(self, obj):
         self.obj = obj
 
@@ -846,13 +958,316 @@ class LazyMap:
         return dir(self.obj)
 
     def __getitem__(self, k):
-        if k not in dir(self.obj):
-            raise KeyError(k)
-        return getattr(self.obj, k)
+        obj = self.obj
+        if k not in obj.__dict__:
+            cls = type(obj)
+            attrs = LazyMap.classAttrs.get(cls)
+            if attrs is None:
+                attrs = LazyMap.classAttrs[cls] = set(dir(cls))
+            if k not in attrs:
+                if not hasattr(cls, k):  # also added to the class after the table was made
+                    raise KeyError(k)
+                attrs.add(k)
+        return getattr(obj, k)
 
     def __setitem__(self, k, v):
         setattr(self.obj, k, v)
 
+class Selection:
+    '''Selected rows of a sheet, keyed by row identity, so that it stays correct however the rows are sorted, inserted or deleted.
+       Row positions from the last scan of the sheet rows are kept, and verified on use, for ordered iteration in O(nSelected).'''
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.selected = {}   # [id(row)] -> row
+        self.positions = {}  # [id(row)] -> index into sheet.rows as of last scan
+
+    def __len__(self):
+        return len(self.selected)
+
+    def __contains__(self, row):
+        return id(row) in self.selected
+
+    def clear(self):
+        self.selected.clear()
+        self.positions.clear()
+
+    def add(self, rows):
+        'Add `rows` to selection (union).'
+        self.selected.update((id(r), r) for r in rows)
+
+    def addIndexes(self, idxs):
+        'Add rows at the given indexes of the sheet rows.'
+        rows = self.sheet.rows
+        for i in idxs:
+            r = rows[i]
+            self.selected[id(r)] = r
+            self.positions[id(r)] = i
+
+    def discard(self, rows):
+        'Remove `rows` from selection; return number removed.'
+        n = len(self.selected)
+        pop = self.selected.pop
+        for r in rows:
+            pop(id(r), None)
+        return n - len(self.selected)
+
+    def toggle(self, rows):
+        'Select the unselected `rows` and unselect the selected ones (symmetric difference).'
+        toggled = {id(r): r for r in rows}
+        for k in toggled.keys() & self.selected.keys():
+            del self.selected[k]
+            del toggled[k]
+        self.selected.update(toggled)
+
+    def intersect(self, rows):
+        'Keep only selected rows which are also in `rows`.'
+        keep = {id(r) for r in rows}
+        self.selected = {k: r for k, r in self.selected.items() if k in keep}
+
+    def invert(self):
+        'Select exactly the rows of the sheet which are not selected.'
+        selected = self.selected
+        self.selected = {id(r): r for r in self.sheet.rows if id(r) not in selected}
+
+    def ordered(self):
+        'Return list of selected rows, in sheet order.'
+        rows = self.sheet.rows
+        nrows = len(rows)
+        positions = self.positions
+        try:
+            idxs = sorted(positions[k] for k in self.selected)
+            ret = [rows[i] for i in idxs if i < nrows]
+            if len(ret) == len(self.selected) and all(id(r) in self.selected and positions[id(r)] == i for i, r in zip(idxs, ret)):
+                return ret
+        except KeyError:  # position not known
+            pass
+
+        # rows were moved or positions not known; rescan
+        positions.clear()
+        ret = []
+        for i, r in enumerate(rows):
+            k = id(r)
+            if k in self.selected:
+                positions[k] = i
+                ret.append(r)
+        return ret
+
+
+class SharedRows:
+    '''Rows shared copy-on-write between sheets, as the sheets which may hold each row, by id(row).
+       A sheet changing a shared row first replaces it with its own deepcopy (see Sheet.ownRow), so the other holders are not affected.
+       Holders are verified then, so a sheet which has been quit or no longer has the row does not cause a copy.'''
+    def __init__(self):
+        self.holders = {}  # [id(row)] -> tuple of sheets which may hold row, if shared
+
+    def __contains__(self, row):
+        return id(row) in self.holders
+
+    def share(self, rows, *sheets):
+        'Add `sheets` to the holders of each of `rows`.'
+        holders = self.holders
+        for r in rows:
+            k = id(r)
+            h = holders.get(k)
+            holders[k] = sheets if h is None else h + tuple(vs for vs in sheets if vs not in h)
+
+    def release(self, row, sheet):
+        'Remove `sheet` from the holders of `row`, and also any which no longer hold it.  Return tuple of the other sheets still holding `row`.'
+        k = id(row)
+        others = tuple(vs for vs in self.holders.get(k, ()) if vs is not sheet and vs in vd().sheets and vs.rowIndex(row) is not None)
+        if len(others) > 1:
+            self.holders[k] = others
+        else:
+            self.holders.pop(k, None)
+        return others
+
+    def prune(self, sheets):
+        'Forget holders which are not in `sheets`, and rows which are then no longer shared.'
+        live = {}  # [id(holders)] -> holders in `sheets`; rows shared at once have the same tuple
+        for k, h in list(self.holders.items()):
+            h2 = live.get(id(h))
+            if h2 is None:
+                h2 = live[id(h)] = tuple(vs for vs in h if vs in sheets)
+            if len(h2) > 1:
+                self.holders[k] = h2
+            else:
+                del self.holders[k]
+
+
+def shareRows(rows, *sheets):
+    'Return list of `rows` for another sheet to hold, sharing the row storage copy-on-write among `sheets`.'
+    ret = list(rows)
+    vd().sharedRows.share(ret, *sheets)
+    return ret
+
+
+class JournalGroup:
+    'Changes made by one command, as a list of (undo, redo) deltas, each a tuple of (func, *args).'
+    def __init__(self):
+        self.deltas = []     # None if any change was not recorded, so the command cannot be reversed
+        self.size = 0        # number of cells and rows held by the deltas
+        self.cmdrow = None   # logged command, if any
+        self.cmdidx = None   # index of cmdrow in the command log
+
+    def __bool__(self):
+        'True if the command can be reversed by its deltas.'
+        return bool(self.deltas)
+
+
+class Journal:
+    '''Bounded log of the changes to sheets made by each command, for undo and redo in time proportional to the change.
+       Changes are recorded by the methods which make them (Column.setValue, Sheet.addRows/removeRows, Sheet.orderBy, Sheet.addColumn),
+       into the group of the command being executed, or of the command which started the current thread.'''
+    def __init__(self):
+        self.groups = []       # JournalGroup for each command, oldest first
+        self.redoGroups = []   # undone JournalGroups, most recently undone last
+        self.current = None    # group of the command being executed
+        self.applying = False  # True while undoing or redoing, so those changes are not recorded again
+        self.size = 0          # total size of the deltas of all groups
+
+    def activeGroup(self):
+        return getattr(threading.current_thread(), 'journalGroup', None) or self.current
+
+    def recording(self):
+        'True if a change made now would be recorded.'
+        if self.applying:
+            return False
+        group = self.activeGroup()
+        return group is not None and group.deltas is not None
+
+    def begin(self):
+        'Start a new group for the command about to be executed.'
+        self.current = JournalGroup()
+
+    def end(self, cmdrow=None, cmdidx=None):
+        'Finish the group of the executed command, keeping it if the command was logged as `cmdrow` or made any change.'
+        group, self.current = self.current, None
+        if group is None:
+            return None
+        group.cmdrow, group.cmdidx = cmdrow, cmdidx
+        if cmdrow is None and not group.deltas:
+            self.size -= group.size
+            return None
+        self.groups.append(group)
+        return group
+
+    def record(self, size, undo, redo):
+        'Record a change of `size` cells or rows, as its inverse `undo` and its `redo`, each a tuple of (func, *args).  A change without `undo` cannot be reversed.'
+        if self.applying:
+            return
+        group = self.activeGroup()
+        if group is None or group.deltas is None:
+            return
+        if undo is None or group.size + size > options.undo_max:
+            self.drop(group)
+            return
+        group.deltas.append((undo, redo))
+        group.size += size
+        self.size += size
+        self.trim()
+
+    def taint(self):
+        'Mark the current command as not reversible, as it changed something which is not recorded.'
+        self.record(0, None, None)
+
+    def drop(self, group):
+        'Discard the deltas of `group`, which can then only be undone by replay.'
+        self.size -= group.size
+        group.deltas = None
+        group.size = 0
+
+    def trim(self):
+        'Discard the deltas of the oldest groups, until the journal is within options.undo_max.'
+        for group in self.groups:
+            if self.size <= options.undo_max:
+                break
+            self.drop(group)
+
+    def apply(self, group, undo=True):
+        'Undo (or redo) the changes of `group`.'
+        self.applying = True
+        try:
+            for u, r in (reversed(group.deltas) if undo else group.deltas):
+                func, *args = u if undo else r
+                func(*args)
+        finally:
+            self.applying = False
+        vd().cellVersion += 1
+
+
+class MatchIndex:
+    '''Rows of a sheet with a displayed value matching a regex in any of the given columns, valid until any cell or the rows change.
+       Keyed by row identity like Selection, with row positions from the last scan verified on use.'''
+    def __init__(self, sheet, regex, columns):
+        self.sheet = sheet
+        self.regex = regex
+        self.columns = columns
+        self.matched = {}     # [id(row)] -> row
+        self.positions = []   # sorted indexes of matched rows into sheet.rows, as of last scan
+        self.version = None
+
+    def currentVersion(self):
+        rows = self.sheet.rows
+        return (vd().cellVersion, options._version, id(rows), len(rows), tuple((c.type, c.fmtstr) for c in self.columns))
+
+    def cellGetters(self):
+        'Return list of functions to get the str to match for each column: the raw value if a str in untyped columns, else the displayed value.'
+        def rawGetter(c):
+            def _get(row, getValue=c.getValue, getDisplayValue=c.getDisplayValue):
+                try:
+                    v = getValue(row)
+                    if type(v) is str:
+                        return v
+                except Exception:
+                    pass
+                return getDisplayValue(row)
+            return _get
+        return [rawGetter(c) if c.type in (str, anytype) and not c.fmtstr else c.getDisplayValue for c in self.columns]
+
+    def matchingColumn(self, row):
+        'Return first column whose value in `row` matches.'
+        for c, get in zip(self.columns, self.cellGetters()):
+            if self.regex.search(get(row)):
+                return c
+
+    def scan(self):
+        'Match every row.'
+        self.version = self.currentVersion()
+        rows = self.sheet.rows
+        getters = self.cellGetters()
+        search = self.regex.search
+        idxs = []
+        for i, r in enumerate(Progress(rows)):
+            for get in getters:
+                if search(get(r)):
+                    idxs.append(i)
+                    break
+
+        self.positions = idxs
+        self.matched = {id(rows[i]): rows[i] for i in idxs}
+
+    def rowIndexes(self):
+        'Return sorted list of indexes of matching rows, rescanning the rows (but not the cells) if any have moved.'
+        rows = self.sheet.rows
+        if len(self.positions) != len(self.matched) or not all(id(rows[i]) in self.matched for i in self.positions):
+            self.positions = [i for i, r in enumerate(rows) if id(r) in self.matched]
+        return self.positions
+
+
+class Reversed:
+    'Sort key wrapper that inverts the order of `v`.'
+    __slots__ = ('v',)
+
+    def __init__(self, v):
+        self.v = v
+
+    def __lt__(self, other):
+        return other.v < self.v
+
+    def __eq__(self, other):
+        return self.v == other.v
+
+
 class Colorizer:
     def __init__(self, colorizerType, precedence, colorfunc):
         self.type = colorizerType
@@ -873,6 +1288,7 @@ class Sheet:
     ]
     nKeys = 0  # self.columns[:nKeys] are all pinned to the left and matched on join
     rowtype = 'rows'
+    cacheCells = True  # False if cells can change other than by setValue/reload (e.g. views of live objects)
 
     def __init__(self, name, **kwargs):
         self.name = name
@@ -901,7 +1317,10 @@ class Sheet:
                 sheetcmds[cmd.name] = cmd
         self._commands = collections.ChainMap(sheetcmds, baseCommands)
 
-        self._selectedRows = {}  # id(row) -> row
+        self._selection = Selection(self)
+        self._matchIndexes = {}  # [(regex, colids)] -> MatchIndex
+        self._rowPositions = {}  # [id(row)] -> index into self.rows as of last scan, for rowIndex
+        self._rowPositionsKey = None  # (id(rows), len(rows)) as of last scan
 
         # for progress bar
         self.progresses = []  # list of Progress objects
@@ -910,6 +1329,7 @@ class Sheet:
         self.currentThreads = []
 
         self._colorizers = {'row': [], 'col': [], 'hdr': [], 'cell': []}
+        self._colorizerChains = {}  # [colorizerTypes] -> list of colorizers in order of application
 
         for b in [self] + list(self.__class__.__bases__):
             for c in getattr(b, 'colorizers', []):
@@ -926,6 +1346,8 @@ class Sheet:
 
     def addColorizer(self, c):
         self._colorizers[c.type].append(c)
+        self._colorizers[c.type].sort(key=lambda x: x.precedence)
+        self._colorizerChains.clear()
 
     def colorizeRow(self, row):
         return self.colorize(['row'], None, row)
@@ -941,16 +1363,21 @@ class Sheet:
 
     def colorize(self, colorizerTypes, col, row, value=None):
         'Returns curses attribute for the given col/row/value'
-        attr = 0
-        attrpre = 0
+        return self.colorizePrec(colorizerTypes, col, row, value)[0]
 
-        for colorizerType in colorizerTypes:
-            for colorizer in sorted(self._colorizers[colorizerType], key=lambda x: x.precedence):
-                color = colorizer.func(self, col, row, value)
-                if color:
-                    attr, attrpre = colors.update(attr, attrpre, color, colorizer.precedence)
+    def colorizePrec(self, colorizerTypes, col, row, value=None, attr=0, attrpre=0):
+        'Returns (curses attribute, precedence of its color) for the given col/row/value, applied after `attr` of precedence `attrpre`'
+        chain = self._colorizerChains.get(tuple(colorizerTypes))
+        if chain is None:
+            chain = [c for t in colorizerTypes for c in self._colorizers[t]]
+            self._colorizerChains[tuple(colorizerTypes)] = chain
 
-        return attr
+        for colorizer in chain:
+            color = colorizer.func(self, col, row, value)
+            if color:
+                attr, attrpre = colors.update(attr, attrpre, color, colorizer.precedence)
+
+        return attr, attrpre
 
     def leftStatus(self):
         'Compose left side of status bar for this sheet (overridable).'
@@ -965,6 +1392,59 @@ class Sheet:
         else:
             self.rows.insert(index, row)
 
+    def addRows(self, rows, index=None):
+        'Insert `rows` at `index` (or after all rows), recording it for undo.'
+        if index is None:
+            index = len(self.rows)
+        self.insertRows(list(enumerate(rows, index)))
+
+    def insertRows(self, pairs):
+        'Insert each row at its index in (index, row) `pairs`, sorted by index and as indexes of the rows afterwards, recording it for undo.'
+        rows = self.rows
+        if len(pairs) < 100:
+            for i, r in pairs:
+                rows.insert(i, r)
+        else:
+            newrows = []
+            it = iter(rows)
+            for i, r in pairs:
+                newrows.extend(itertools.islice(it, i-len(newrows)))
+                newrows.append(r)
+            newrows.extend(it)
+            rows[:] = newrows
+        vd().journal.record(len(pairs), (self.removeRows, [i for i, r in pairs]), (self.insertRows, pairs))
+
+    def removeRows(self, idxs):
+        'Remove the rows at sorted `idxs`, recording it for undo.  Return list of the removed rows.'
+        rows = self.rows
+        pairs = [(i, rows[i]) for i in idxs]
+        if len(idxs) < 100:
+            for i in reversed(idxs):
+                del rows[i]
+        else:
+            drop = set(idxs)
+            rows[:] = [r for i, r in enumerate(rows) if i not in drop]
+        vd().journal.record(len(pairs), (self.insertRows, pairs), (self.removeRows, idxs))
+        return [r for i, r in pairs]
+
+    def matchIndex(self, regex, columns):
+        '''Return MatchIndex of rows matching compiled `regex` in any of `columns`, reusing the last one if the data has not changed since.
+           Never reused for sheets which do not cache cells, whose values can change without bumping cellVersion.'''
+        if not self.cacheCells:
+            mi = MatchIndex(self, regex, columns)
+            mi.scan()
+            return mi
+
+        k = (regex.pattern, regex.flags, tuple(id(c) for c in columns))
+        mi = self._matchIndexes.get(k)
+        if mi is None or mi.version != mi.currentVersion():
+            if len(self._matchIndexes) > 16:
+                self._matchIndexes.clear()
+            mi = MatchIndex(self, regex, columns)
+            mi.scan()
+            self._matchIndexes[k] = mi
+        return mi
+
     def searchColumnNameRegex(self, colregex, moveCursor=False):
         'Select visible column matching `colregex`, if found.'
         for i, c in enumPivot(self.visibleCols, self.cursorVisibleColIndex):
@@ -974,11 +1454,15 @@ class Sheet:
                 return c
 
     def recalc(self):
+        vd().journal.taint()  # columns and rows may have been replaced wholesale
         for c in self.columns:
-            if c._cachedValues:
+            if c._cachedValues is not None:
                 c._cachedValues.clear()
             c.sheet = self
             c.name = c._name
+        self._cellCache = {}  # [(id(row), id(col), width)] -> (row, col, type, fmtstr, DisplayWrapper) as last drawn
+        self._cellCacheVersion = None
+        vd().cellVersion += 1
 
     def reload(self):
         'Default reloader wraps provided `loader` function'
@@ -995,7 +1479,9 @@ class Sheet:
         ret.rows = []                     # a fresh list without incurring any overhead
         ret.columns = deepcopy(self.columns) # deepcopy columns even for shallow copy of sheet
         ret.recalc()  # set .sheet on columns
-        ret._selectedRows = {}
+        ret._selection = Selection(ret)
+        ret._matchIndexes = {}
+        ret._rowPositions = {}
         ret.topRowIndex = ret.cursorRowIndex = 0
         ret.progresses = []
         ret.currentThreads = []
@@ -1010,28 +1496,20 @@ class Sheet:
     @async
     def deleteSelected(self):
         'Delete all selected rows.'
-        oldrows = copy(self.rows)
         oldidx = self.cursorRowIndex
-        ndeleted = 0
+        idxs = [i for i, r in enumerate(Progress(self.rows)) if self.isSelected(r)]
 
-        row = None   # row to re-place cursor after
-        while oldidx < len(oldrows):
-            if not self.isSelected(oldrows[oldidx]):
-                row = self.rows[oldidx]
-                break
-            oldidx += 1
-
-        self.rows.clear()
-        for r in Progress(oldrows):
-            if not self.isSelected(r):
-                self.rows.append(r)
-                if r is row:
-                    self.cursorRowIndex = len(self.rows)-1
-            else:
-                ndeleted += 1
+        while oldidx < len(self.rows) and self.isSelected(self.rows[oldidx]):
+            oldidx += 1   # re-place cursor on the next unselected row
 
-        nselected = len(self._selectedRows)
-        self._selectedRows.clear()
+        deleted = self.removeRows(idxs)
+        ndeleted = len(deleted)
+        if oldidx < len(self.rows) + ndeleted:
+            self.cursorRowIndex = oldidx - bisect.bisect_left(idxs, oldidx)
+
+        nselected = len(self._selection)
+        self._selection.clear()
+        vd().journal.record(0, (self._selection.add, deleted), (self._selection.clear,))
         status('deleted %s rows' % ndeleted)
         if ndeleted != nselected:
             error('expected %s' % nselected)
@@ -1051,7 +1529,7 @@ class Sheet:
         return cmd
 
     def exec_keystrokes(self, keystrokes, vdglobals=None):  # handle multiple commands concatenated?
-        return self.exec_command(self.getCommand(keystrokes), vdglobals, keystrokes=keystrokes)
+        return self.exec_command(self.getCommand(keystrokes), vdglobals=vdglobals, keystrokes=keystrokes)
 
     def exec_command(self, cmd, args='', vdglobals=None, keystrokes=None):
         "Execute `cmd` tuple with `vdglobals` as globals and this sheet's attributes as locals.  Returns True if user cancelled."
@@ -1065,7 +1543,7 @@ class Sheet:
 
         try:
             self.vd.callHook('preexec', self, cmd.name if options.cmdlog_longname else keystrokes)
-            exec(cmd.execstr, vdglobals, LazyMap(self))
+            exec(cmd.code, vdglobals, LazyMap(self))
         except EscapeException as e:  # user aborted
             self.vd.status('aborted')
             escaped = True
@@ -1173,7 +1651,7 @@ class Sheet:
     @property
     def statusLine(self):
         'String of row and column stats.'
-        rowinfo = 'row %d/%d (%d selected)' % (self.cursorRowIndex, self.nRows, len(self._selectedRows))
+        rowinfo = 'row %d/%d (%d selected)' % (self.cursorRowIndex, self.nRows, len(self._selection))
         colinfo = 'col %d/%d (%d visible)' % (self.cursorColIndex, self.nCols, len(self.visibleCols))
         return '%s  %s' % (rowinfo, colinfo)
 
@@ -1192,51 +1670,118 @@ class Sheet:
         'Number of visible columns on this sheet.'
         return len(self.visibleCols)
 
+    def rowIndex(self, row):
+        '''Return index of `row` in self.rows, by identity, or None if it is not on this sheet.
+           Positions from the last scan are verified on use, and rescanned if they are wrong or the rows have been added to or removed from.'''
+        rows = self.rows
+        positions = self._rowPositions
+        i = positions.get(id(row))
+        if i is not None and i < len(rows) and rows[i] is row:
+            return i
+        key = (id(rows), len(rows))
+        if i is None and positions and self._rowPositionsKey == key:  # rows only moved (or replaced by swapRow) since
+            return None
+        positions.clear()
+        positions.update((id(r), i) for i, r in enumerate(rows))
+        self._rowPositionsKey = key
+        i = positions.get(id(row))
+        if i is not None and rows[i] is row:
+            return i
+
+    def ownRow(self, row):
+        '''Return `row` to be changed in place.  If it is shared with another sheet (see shareRows),
+           first replace it on this sheet with a deepcopy, and return that instead.'''
+        shared = vd().sharedRows
+        if row not in shared or self.rowIndex(row) is None:
+            return row
+
+        others = shared.release(row, self)
+        if not others:
+            return row
+
+        newrow = deepcopy(row)
+        vd().journal.record(0, (self.swapRow, newrow, row, others), (self.swapRow, row, newrow))
+        self.swapRow(row, newrow)
+        return newrow
+
+    def swapRow(self, oldrow, newrow, holders=()):
+        'Replace `oldrow` with `newrow` on this sheet, keeping its selection and column state, and share `newrow` with the sheets in `holders`, if any.'
+        i = self.rowIndex(oldrow)
+        self.rows[i] = newrow
+        del self._rowPositions[id(oldrow)]
+        self._rowPositions[id(newrow)] = i
+        if oldrow in self._selection:
+            self._selection.discard([oldrow])
+            self._selection.add([newrow])
+        for c in self.columns:
+            c.replaceRow(oldrow, newrow)
+        if holders:
+            vd().sharedRows.share([newrow], self, *holders)
+
 ## selection code
     def isSelected(self, row):
-        'True if given row is selected. O(log n).'
-        return id(row) in self._selectedRows
+        'True if given row is selected. O(1).'
+        return row in self._selection
+
+    def _rowHooked(self):
+        'True if selectRow/unselectRow are overridden, so selection changes must go through them row by row.'
+        cls = type(self)
+        return cls.selectRow is not Sheet.selectRow or cls.unselectRow is not Sheet.unselectRow
 
     @async
     def toggle(self, rows):
         'Toggle selection of given `rows`.'
-        for r in Progress(rows, len(self.rows)):
-            if not self.unselectRow(r):
-                self.selectRow(r)
+        if self._rowHooked():
+            for r in Progress(rows, len(self.rows)):
+                if not self.unselectRow(r):
+                    self.selectRow(r)
+        elif rows is self.rows:
+            self._selection.invert()
+        else:
+            self._selection.toggle(Progress(rows, len(self.rows)))
 
     def selectRow(self, row):
-        'Select given row. O(log n)'
-        self._selectedRows[id(row)] = row
+        'Select given row. O(1)'
+        self._selection.add([row])
 
     def unselectRow(self, row):
-        'Unselect given row, return True if selected; else return False. O(log n)'
-        if id(row) in self._selectedRows:
-            del self._selectedRows[id(row)]
-            return True
-        else:
-            return False
+        'Unselect given row, return True if selected; else return False. O(1)'
+        return self._selection.discard([row]) > 0
 
     @async
     def select(self, rows, status=True, progress=True):
         "Select given rows. Don't show progress if progress=False; don't show status if status=False."
-        before = len(self._selectedRows)
-        for r in (Progress(rows) if progress else rows):
-            self.selectRow(r)
+        before = len(self._selection)
+        rows = Progress(rows) if progress else rows
+        if self._rowHooked():
+            for r in rows:
+                self.selectRow(r)
+        else:
+            self._selection.add(rows)
         if status:
-            vd().status('selected %s%s rows' % (len(self._selectedRows)-before, ' more' if before > 0 else ''))
+            vd().status('selected %s%s rows' % (len(self._selection)-before, ' more' if before > 0 else ''))
 
     @async
     def unselect(self, rows, status=True, progress=True):
         "Unselect given rows. Don't show progress if progress=False; don't show status if status=False."
-        before = len(self._selectedRows)
-        for r in (Progress(rows) if progress else rows):
-            self.unselectRow(r)
+        before = len(self._selection)
+        rows = Progress(rows) if progress else rows
+        if self._rowHooked():
+            for r in rows:
+                self.unselectRow(r)
+        else:
+            self._selection.discard(rows)
         if status:
-            vd().status('unselected %s/%s rows' % (before-len(self._selectedRows), before))
+            vd().status('unselected %s/%s rows' % (before-len(self._selection), before))
 
     def selectByIdx(self, rowIdxs):
         'Select given row indexes, without progress bar.'
-        self.select((self.rows[i] for i in rowIdxs), progress=False)
+        if self._rowHooked():
+            self.select((self.rows[i] for i in rowIdxs), progress=False)
+        else:
+            before = len(self._selection)
+            self._selection.addIndexes(rowIdxs)
+            vd().status('selected %s%s rows' % (len(self._selection)-before, ' more' if before > 0 else ''))
 
     def unselectByIdx(self, rowIdxs):
         'Unselect given row indexes, without progress bar.'
@@ -1248,15 +1793,52 @@ class Sheet:
             if func(r):
                 yield r
 
-    def orderBy(self, *cols, **kwargs):
-        self.rows.sort(key=lambda r,cols=cols: tuple(c.getTypedValue(r) for c in cols), **kwargs)
+    def sortDirections(self, s):
+        'Return list of `reverse` flags for orderBy(*keyCols) from `s`, with one "+" (ascending) or "-" (descending) for each key column.'
+        if len(s) != len(self.keyCols) or s.strip('+-'):
+            error('need one + or - for each of the %s key columns' % len(self.keyCols))
+        return [ch == '-' for ch in s]
+
+    @async
+    def orderBy(self, *cols, reverse=False):
+        '''Sort rows by the typed values of `cols`, converting each column only once.
+           `reverse` is a bool for all columns, or a list of bools for each column.'''
+        if not cols:
+            return
+        if isinstance(reverse, bool):
+            reverse = [reverse]*len(cols)
+        elif len(reverse) != len(cols):
+            error('%s sort directions given for %s columns' % (len(reverse), len(cols)))
+
+        rows = self.rows
+        nrows = len(rows)
+
+        keyvecs = []
+        with Progress(total=len(cols)) as prog:
+            for col, rev in zip(cols, reverse):
+                vals = col.getTypedVector(rows).values
+                if rev != reverse[0]:  # mixed directions: compare this key inverted, in an ascending sort
+                    vals = [Reversed(v) for v in vals]
+                keyvecs.append(vals)
+                prog.addProgress(1)
+
+        keys = keyvecs[0] if len(keyvecs) == 1 else list(zip(*keyvecs))
+        order = sorted(range(nrows), key=keys.__getitem__, reverse=reverse[0])
+
+        if self.rows is not rows or len(rows) != nrows:
+            error('rows changed during sort; not sorted')
+
+        cursorRow = rows[self.cursorRowIndex] if 0 <= self.cursorRowIndex < nrows else None
+        sortedRows = [rows[i] for i in order]
+        vd().journal.record(nrows, (setitem, rows, slice(None), list(rows)), (setitem, rows, slice(None), sortedRows))
+        self.rows[:] = sortedRows
+        if cursorRow is not None:
+            self.cursorRowIndex = next(i for i, r in enumerate(sortedRows) if r is cursorRow)
 
     @property
     def selectedRows(self):
-        'List of selected rows in sheet order. [O(nRows*log(nSelected))]'
-        if len(self._selectedRows) <= 1:
-            return list(self._selectedRows.values())
-        return [r for r in self.rows if id(r) in self._selectedRows]
+        'List of selected rows in sheet order. [O(nSelected*log(nSelected)) if rows have not moved since last time, else O(nRows)]'
+        return self._selection.ordered()
 
 ## end selection code
 
@@ -1318,6 +1900,7 @@ class Sheet:
                 index = len(self.columns)
             col.sheet = self
             self.columns.insert(index, col)
+            vd().journal.record(1, (self.columns.remove, col), (self.columns.insert, index, col))
             return col
 
     def toggleKeyColumn(self, colidx):
@@ -1456,6 +2039,15 @@ class Sheet:
 
         self.rowLayout = {}
         self.calcColLayout()
+
+        opts = options.snapshot()  # for the rest of this frame
+        version = (vd().cellVersion, opts._version)
+        if version != self._cellCacheVersion or len(self._cellCache) > 16384:
+            self._cellCache.clear()
+            self._cellCacheVersion = version
+
+        rowattrs = {}  # [rowidx] -> (attr, precedence) from row colorizers, computed once per row
+        keyCols = self.keyCols
         vcolidx = 0
         for vcolidx, colinfo in sorted(self.visibleColLayout.items()):
             x, colwidth = colinfo
@@ -1465,6 +2057,12 @@ class Sheet:
                 headerRow = 0
                 self.drawColHeader(scr, headerRow, vcolidx)
 
+                colattr, colpre = self.colorizePrec(['col'], col, None)
+
+                sepchars = opts.disp_column_sep
+                if (keyCols and col is keyCols[-1]) or vcolidx == self.rightVisibleColIndex:
+                    sepchars = opts.disp_keycol_sep
+
                 y = headerRow + numHeaderRows
 
                 for rowidx in range(0, self.nVisibleRows):
@@ -1475,18 +2073,24 @@ class Sheet:
                     self.rowLayout[dispRowIdx] = y
 
                     row = self.rows[dispRowIdx]
-                    cellval = col.getCell(row, colwidth-1)
+                    cellval = self.getCell(col, row, colwidth-1)
+
+                    rowattr = rowattrs.get(dispRowIdx)
+                    if rowattr is None:
+                        rowattr = rowattrs[dispRowIdx] = self.colorizePrec(['row'], None, row)
 
-                    attr = self.colorizeCell(col, row, cellval)
+                    # same as colorizeCell, with col and row colorizers applied in turn
+                    attr, attrpre = colors.merge(colattr, colpre, *rowattr)
+                    attr, attrpre = self.colorizePrec(['cell'], col, row, cellval, attr, attrpre)
                     attrpre = 0
-                    sepattr = self.colorizeRow(row)
+                    sepattr = rowattr[0]
 
                     # must apply current row here, because this colorization requires cursorRowIndex
                     if dispRowIdx == self.cursorRowIndex:
-                        attr, attrpre = colors.update(attr, 0, options.color_current_row, 10)
-                        sepattr, _ = colors.update(sepattr, 0, options.color_current_row, 10)
+                        attr, attrpre = colors.update(attr, 0, opts.color_current_row, 10)
+                        sepattr, _ = colors.update(sepattr, 0, opts.color_current_row, 10)
 
-                    sepattr = sepattr or colors[options.color_column_sep]
+                    sepattr = sepattr or colors[opts.color_column_sep]
 
                     _clipdraw(scr, y, x, disp_column_fill+cellval.display, attr, colwidth)
 
@@ -1496,19 +2100,31 @@ class Sheet:
                         noteattr, _ = colors.update(attr, attrpre, cellval.notecolor, 8)
                         _clipdraw(scr, y, x+colwidth-len(note), note, noteattr, len(note))
 
-                    sepchars = options.disp_column_sep
-                    if (self.keyCols and col is self.keyCols[-1]) or vcolidx == self.rightVisibleColIndex:
-                        sepchars = options.disp_keycol_sep
-
                     if x+colwidth+len(sepchars) <= self.vd.windowWidth:
                        scr.addstr(y, x+colwidth, sepchars, sepattr)
 
                     y += 1
 
         if vcolidx+1 < self.nVisibleCols:
-            scr.addstr(headerRow, self.vd.windowWidth-2, options.disp_more_right, colors[options.color_column_sep])
+            scr.addstr(headerRow, self.vd.windowWidth-2, opts.disp_more_right, colors[opts.color_column_sep])
 
 
+    def getCell(self, col, row, width):
+        'Return DisplayWrapper for `row` at `col`, formatting it again only if it may have changed since last drawn.'
+        if not self.cacheCells or self.currentThreads:  # cells may be filled in as the sheet loads
+            return col.getCell(row, width)
+
+        k = (id(row), id(col), width)
+        e = self._cellCache.get(k)
+        t, fmtstr = col.type, col.fmtstr
+        if e is not None and e[0] is row and e[1] is col and e[2] is t and e[3] == fmtstr:
+            return e[4]
+
+        dw = col.getCell(row, width)
+        if not getattr(dw, 'pending', False):
+            self._cellCache[k] = (row, col, t, fmtstr, dw)
+        return dw
+
     def editCell(self, vcolidx=None, rowidx=None):
         'Call `editText` at its place on the screen.  Returns the new value, properly typed'
 
@@ -1533,6 +2149,7 @@ class Sheet:
         return r
 
 
+@optionsCached('none_is_null', 'empty_is_null', 'false_is_null', 'zero_is_null')
 def isNullFunc():
     'Returns isNull function according to current options.'
     nullset = []
@@ -1543,7 +2160,143 @@ def isNullFunc():
     return lambda v,nullset=nullset: v in nullset
 
 
+class ColumnCache:
+    '''Cache of computed values for one Column, keyed by row identity.
+       Evicts by `policy` once over `maxsize` entries (lru/lfu), or over options.col_cache_budget_mb across all caches.'''
+    policies = ('lru', 'lfu', 'full')
+    allCaches = weakref.WeakSet()
+    totalSize = 0   # approximate bytes in all caches; recounted when over budget
+    lock = threading.RLock()  # for totalSize and the entries of all caches, which async threads also fill
+
+    def __init__(self, policy=None, maxsize=None):
+        self.policy = policy or options.col_cache_policy
+        if self.policy not in self.policies:
+            error('cache policy must be one of ' + ' '.join(self.policies))
+        self.maxsize = maxsize  # options.col_cache_size if None
+        self.entries = collections.OrderedDict()  # [id(row)] -> [row, value, size, uses]
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        ColumnCache.allCaches.add(self)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, row):
+        'Return cache entry for `row` (value is entry[1]), or None.'
+        k = id(row)
+        with ColumnCache.lock:
+            e = self.entries.get(k)
+            if e is None or e[0] is not row:  # the id of a freed row can be reused
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.policy == 'lru':
+                self.entries.move_to_end(k)
+            else:
+                e[3] += 1
+            return e
+
+    def store(self, row, value):
+        k = id(row)
+        n = sys.getsizeof(value) + 128  # and the entry itself
+        maxsize = self.maxsize or options.col_cache_size
+        budget = options.col_cache_budget_mb*1024*1024
+        with ColumnCache.lock:
+            self.discard(k)
+            self.entries[k] = [row, value, n, 1]
+            self.size += n
+            ColumnCache.totalSize += n
+
+            if self.policy != 'full' and len(self.entries) > maxsize:
+                self.evict(max(1, maxsize//8) if self.policy == 'lfu' else len(self.entries)-maxsize)
+
+            if ColumnCache.totalSize > budget:
+                ColumnCache.trimAll()
+
+    def discard(self, k):
+        'Remove entry for row with id `k`, if any.'
+        with ColumnCache.lock:
+            e = self.entries.pop(k, None)
+            if e is not None:
+                self.size -= e[2]
+                ColumnCache.totalSize -= e[2]
+
+    def evict(self, n):
+        'Remove `n` entries: least used for lfu, otherwise least recently used (or stored).'
+        with ColumnCache.lock:
+            if self.policy == 'lfu':
+                keys = [k for k, e in heapq.nsmallest(n, self.entries.items(), key=lambda kv: kv[1][3])]
+            else:
+                keys = list(itertools.islice(self.entries, n))
+            for k in keys:
+                self.discard(k)
+            self.evictions += len(keys)
+
+    def clear(self):
+        with ColumnCache.lock:
+            ColumnCache.totalSize -= self.size
+            self.entries.clear()
+            self.size = 0
+
+    @classmethod
+    def trimAll(cls):
+        'Evict from the largest caches until all are within the global budget.'
+        budget = options.col_cache_budget_mb*1024*1024
+        with cls.lock:
+            caches = list(cls.allCaches)
+            cls.totalSize = sum(c.size for c in caches)
+            while cls.totalSize > budget:
+                largest = max(caches, key=lambda c: c.size)
+                largest.evict(max(1, len(largest)//4))
+
+
+class TypedValues:
+    'Typed values of a Column for a list of rows, with bytearrays marking the cells which failed conversion (`errors`) or are null (`nulls`).'
+    def __init__(self, rows, values, errors, nulls):
+        self.rows = rows
+        self.values = values   # the type's default value where conversion failed, as from getTypedValue
+        self.errors = errors
+        self.nulls = nulls
+        self._rowpos = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def sameRows(self, rows):
+        'True if `rows` are exactly the rows of this vector, in the same order.'
+        return len(rows) == len(self.rows) and all(map(operator.is_, rows, self.rows))
+
+    @property
+    def rowpos(self):
+        'dict of id(row) -> position in this vector'
+        if self._rowpos is None:
+            self._rowpos = {id(r): i for i, r in enumerate(self.rows)}
+        return self._rowpos
+
+    def subset(self, rows):
+        'Return TypedValues for `rows`, taken from this vector, or None if any row is not in it.'
+        rowpos = self.rowpos
+        try:
+            idxs = [rowpos[id(r)] for r in rows]
+        except KeyError:
+            return None
+        return TypedValues(rows,
+                [self.values[i] for i in idxs],
+                bytearray(self.errors[i] for i in idxs),
+                bytearray(self.nulls[i] for i in idxs))
+
+    def validValues(self):
+        'Generate (val, row) for cells which are neither errors nor nulls.'
+        for v, r, err, null in zip(self.values, self.rows, self.errors, self.nulls):
+            if not err and not null:
+                yield v, r
+
+
 class Column:
+    cacheTypedVector = True  # False if values can change without invalidateRow on this column's sheet
+
     def __init__(self, name, type=anytype, cache=False, **kwargs):
         self.sheet = None     # owning sheet, set in Sheet.addColumn
         self.name = name      # display visible name
@@ -1553,7 +2306,10 @@ class Column:
         self.setter = None    # setter(col,row,value)
         self.width = None     # == 0 if hidden, None if auto-compute next time
 
-        self._cachedValues = collections.OrderedDict() if cache else None
+        self._cachedValues = None  # ColumnCache, if caching
+        if cache:
+            self.setCache(cache if isinstance(cache, str) else None)
+        self._typedVector = None  # TypedValues for the sheet rows, from getTypedVector
         for k, v in kwargs.items():
             setattr(self, k, v)  # instead of __dict__.update(kwargs) to invoke property.setters
 
@@ -1561,8 +2317,8 @@ class Column:
         cls = self.__class__
         ret = cls.__new__(cls)
         ret.__dict__.update(self.__dict__)
-        if ret._cachedValues:
-            ret._cachedValues = collections.OrderedDict()  # a fresh cache
+        if ret._cachedValues is not None:
+            ret._cachedValues = ColumnCache(ret._cachedValues.policy, ret._cachedValues.maxsize)  # a fresh cache
         return ret
 
     def __deepcopy__(self, memo):
@@ -1580,6 +2336,15 @@ class Column:
             name = clean_to_id(name)
         self._name = name
 
+    @property
+    def type(self):
+        return self._type
+
+    @type.setter
+    def type(self, t):
+        self._type = t
+        self._typedVector = None
+
     @property
     def fmtstr(self):
         if self._fmtstr:
@@ -1619,15 +2384,7 @@ class Column:
 
     def getValueRows(self, rows):
         'Generate (val, row) for the given `rows` at this Column, excluding errors and nulls.'
-        f = isNullFunc()
-
-        for r in rows:
-            try:
-                v = self.type(self.getValue(r))
-                if not f(v):
-                    yield v, r
-            except Exception:
-                pass
+        return self.getTypedVector(rows).validValues()
 
     def getValues(self, rows):
         for v, r in self.getValueRows(rows):
@@ -1645,22 +2402,77 @@ class Column:
 #            exceptionCaught(status=False)
             return self.type()
 
+    def getTypedVector(self, rows):
+        '''Return TypedValues for `rows`, converting each cell only once for the rows of the sheet.
+           The vector for the sheet rows is cached until the type is changed or a value is set, unless the sheet does not cache cells.'''
+        cached = self.cacheTypedVector and self.sheet is not None and self.sheet.cacheCells
+        sheetRows = cached and rows is self.sheet.rows
+        rows = list(rows)  # snapshot, as the sheet rows may be added to (while loading) or changed in place
+
+        tv = self._typedVector if cached else None
+        if tv is not None:
+            if tv.sameRows(rows):
+                return tv
+            sub = tv.subset(rows)
+            if sub is not None:
+                return sub
+
+        t = self.type
+        isNull = isNullFunc()
+        n = len(rows)
+        values = [None]*n
+        errors = bytearray(n)
+        nulls = bytearray(n)
+        for i, r in enumerate(Progress(rows)):
+            try:
+                v = t(self.getValue(r))
+                nulls[i] = isNull(v)
+            except Exception:
+                v = t()
+                errors[i] = 1
+            values[i] = v
+
+        tv = TypedValues(rows, values, errors, nulls)
+        if sheetRows:
+            self._typedVector = tv
+        return tv
+
+    def setCache(self, policy=None, maxsize=None):
+        'Add a new ColumnCache with the given `policy` (or remove caching if policy is False).'
+        self._cachedValues = ColumnCache(policy, maxsize) if policy is not False else None
+
     def getValue(self, row):
-        'Memoize calcValue with key id(row)'
-        if self._cachedValues is None:
+        'Memoize calcValue in the column cache, if any'
+        cache = self._cachedValues
+        if cache is None:
             return self.calcValue(row)
 
-        k = id(row)
-        if k in self._cachedValues:
-            return self._cachedValues[k]
+        e = cache.lookup(row)
+        if e is not None:
+            return e[1]
 
         ret = self.calcValue(row)
-        self._cachedValues[k] = ret
+        cache.store(row, ret)
+        return ret
 
-        if len(self._cachedValues) > 256:  # max number of entries
-            self._cachedValues.popitem(last=False)
+    def invalidateRow(self, row):
+        'Discard cached and typed values for `row` in all columns of the sheet, after `row` is changed.'
+        for c in (self.sheet.columns if self.sheet else [self]):
+            c._typedVector = None
+            if c._cachedValues is not None:
+                c._cachedValues.discard(id(row))
+        vd().cellVersion += 1
 
-        return ret
+    def replaceRow(self, oldrow, newrow):
+        'Called after `newrow`, a copy of `oldrow`, replaces it on the sheet.  Override to carry over anything kept by row identity.'
+        pass
+
+    def clearCache(self):
+        'Discard all cached and typed values for this column.'
+        if self._cachedValues is not None:
+            self._cachedValues.clear()
+        self._typedVector = None
+        vd().cellVersion += 1
 
     def getCell(self, row, width=None):
         'Return DisplayWrapper for displayable cell value.'
@@ -1674,6 +2486,7 @@ class Column:
 
         if isinstance(cellval, threading.Thread):
             return DisplayWrapper(None,
+                                pending=True,
                                 display=options.disp_pending,
                                 note=options.note_pending,
                                 notecolor=options.color_note_pending)
@@ -1709,7 +2522,22 @@ class Column:
     def setValue(self, row, value):
         if not self.setter:
             error('column cannot be changed')
+        if self.sheet:
+            row = self.sheet.ownRow(row)
+        self.recordValue(row, value)
         self.setter(self, row, value)
+        self.invalidateRow(row)
+
+    def recordValue(self, row, value):
+        'Record the change of this column of `row` to `value` for undo, before it is set.'
+        journal = vd().journal
+        if journal.recording():
+            try:
+                oldvalue = self.getValue(row)
+            except Exception:
+                journal.taint()
+                return
+            journal.record(1, (self.setValue, row, oldvalue), (self.setValue, row, value))
 
     def setValues(self, rows, value):
         'Set given rows to `value`.'
@@ -1773,6 +2601,8 @@ def ArrayColumns(ncols):
 
 
 class SubrowColumn(Column):
+    cacheTypedVector = False  # subrows are rows of other sheets, which can be changed there
+
     def __init__(self, origcol, subrowidx, **kwargs):
         super().__init__(origcol.name, type=origcol.type, width=origcol.width, **kwargs)
         self.origcol = origcol
@@ -1787,6 +2617,7 @@ class SubrowColumn(Column):
         subrow = row[self.subrowidx]
         if subrow is not None:
            self.origcol.setValue(subrow, value)
+           self.invalidateRow(row)
 
 
 class DisplayWrapper:
@@ -1809,7 +2640,11 @@ class ColumnEnum(Column):
     def setValue(self, row, value):
         if isinstance(value, str):  # first try to get the actual value from the mapping
             value = self.mapping.get(value, value)
+        if self.sheet:
+            row = self.sheet.ownRow(row)
+        self.recordValue(row, value)
         setattr(row, self.name, value or self.default)
+        self.invalidateRow(row)
 
 
 class LazyMapRow:
@@ -1850,6 +2685,7 @@ class ColumnExpr(Column):
     def expr(self, expr):
         self._expr = expr
         self.compiledExpr = compile(expr, '<expr>', 'eval')
+        self.clearCache()
 
 ###
 
@@ -1866,11 +2702,14 @@ def clipstr(s, dispw):
     Note: width may differ from len(s) if East Asian chars are 'fullwidth'.'''
     w = 0
     ret = ''
-    ambig_width = options.disp_ambig_width
+    opts = options.snapshot()
+    ambig_width = opts.disp_ambig_width
+    oddspace = opts.disp_oddspace
+    truncator = opts.disp_truncator
     for c in s:
         if c != ' ' and unicodedata.category(c) in ('Cc', 'Zs', 'Zl'):  # control char, space, line sep
-            ret += options.disp_oddspace
-            w += len(options.disp_oddspace)
+            ret += oddspace
+            w += len(oddspace)
         else:
             ret += c
             eaw = unicodedata.east_asian_width(c)
@@ -1881,9 +2720,9 @@ def clipstr(s, dispw):
             elif not unicodedata.combining(c):
                 w += 1
 
-        if w > dispw-len(options.disp_truncator)+1:
-            ret = ret[:-2] + options.disp_truncator  # replace final char with ellipsis
-            w += len(options.disp_truncator)
+        if w > dispw-len(truncator)+1:
+            ret = ret[:-2] + truncator  # replace final char with ellipsis
+            w += len(truncator)
             break
 
     return ret, w
@@ -1906,17 +2745,21 @@ class TextSheet(Sheet):
     def reload(self):
         self.columns = [Column(self.name, getter=lambda col,row: row[1])]
         self.rows = []
-        winWidth = vd().windowWidth
         for text in self.source:
-            if getattr(self, 'wrap', options.wrap):
-                startingLine = len(self.rows)
-                for i, L in enumerate(textwrap.wrap(str(text), width=winWidth-2)):
-                    self.addRow((startingLine+i, L))
-            else:
-                self.addRow((len(self.rows), text))
+            self.addLine(text)
+
+    def addLine(self, text):
+        'Add a row for one line of text, or several if wrapped.'
+        if getattr(self, 'wrap', options.wrap):
+            startingLine = len(self.rows)
+            for i, L in enumerate(textwrap.wrap(str(text), width=vd().windowWidth-2)):
+                self.addRow((startingLine+i, L))
+        else:
+            self.addRow((len(self.rows), text))
 
 class ColumnsSheet(Sheet):
     rowtype = 'columns'
+    cacheCells = False
     class ValueColumn(Column):
         def calcValue(self, srcCol):
             return srcCol.getDisplayValue(self.sheet.source.cursorRow)
@@ -1928,7 +2771,11 @@ class ColumnsSheet(Sheet):
             ColumnAttr('width', type=int),
             ColumnEnum('type', globals(), default=anytype),
             ColumnAttr('fmtstr'),
-            ValueColumn('value')
+            ValueColumn('value'),
+            Column('cache', getter=lambda col,c: c._cachedValues.policy if c._cachedValues is not None else ''),
+            Column('cache_hits', type=int, getter=lambda col,c: c._cachedValues.hits if c._cachedValues is not None else None),
+            Column('cache_misses', type=int, getter=lambda col,c: c._cachedValues.misses if c._cachedValues is not None else None),
+            Column('cache_evictions', type=int, getter=lambda col,c: c._cachedValues.evictions if c._cachedValues is not None else None),
     ]
     nKeys = 1
     colorizers = [
@@ -1944,6 +2791,7 @@ class ColumnsSheet(Sheet):
 
 class SheetsSheet(Sheet):
     rowtype = 'sheets'
+    cacheCells = False
     commands = [Command(ENTER, 'jumpTo(cursorRowIndex)', 'jump to sheet referenced in current row')]
     columns = [
         ColumnAttr('name'),
@@ -1989,6 +2837,7 @@ class HelpSheet(Sheet):
 
 class OptionsSheet(Sheet):
     rowtype = 'options'
+    cacheCells = False
     commands = [
         Command(ENTER, 'source[cursorRow[0]] = editCell(1)', 'edit option'),
         Command('e', ENTER)
@@ -2214,8 +3063,10 @@ class ColorMaker:
     def __init__(self):
         self.attrs = {}
         self.color_attrs = {}
+        self.parsed = {}  # [colornamestr] -> (color attr or None, other attrs)
 
     def setup(self):
+        self.parsed.clear()
         self.color_attrs['black'] = curses.color_pair(0)
 
         for c in range(0, options.force_256_colors and 256 or curses.COLORS):
@@ -2236,19 +3087,37 @@ class ColorMaker:
         color, prec = self.update(0, 0, colornamestr, 10)
         return color
 
-    def update(self, attr, attr_prec, colornamestr, newcolor_prec):
-        attr = attr or 0
-        if isinstance(colornamestr, str):
+    def parse(self, colornamestr):
+        'Return (color attr or None, other attrs) for a string of color and attribute names; the first color given wins.'
+        r = self.parsed.get(colornamestr)
+        if r is None:
+            color, other = None, 0
             for colorname in colornamestr.split(' '):
                 if colorname in self.color_attrs:
-                    if newcolor_prec > attr_prec:
-                        attr &= ~2047
-                        attr |= self.color_attrs[colorname.lower()]
-                        attr_prec = newcolor_prec
+                    if color is None:
+                        color = self.color_attrs[colorname.lower()]
                 elif colorname in self.attrs:
-                    attr |= self.attrs[colorname.lower()]
+                    other |= self.attrs[colorname.lower()]
+            r = self.parsed[colornamestr] = (color, other)
+        return r
+
+    def update(self, attr, attr_prec, colornamestr, newcolor_prec):
+        attr = attr or 0
+        if isinstance(colornamestr, str):
+            color, other = self.parse(colornamestr)
+            if color is not None and newcolor_prec > attr_prec:
+                attr &= ~2047
+                attr |= color
+                attr_prec = newcolor_prec
+            attr |= other
         return attr, attr_prec
 
+    def merge(self, attr, attr_prec, newattr, newattr_prec):
+        'Combine attrs as resulting from update(), as if the updates for `newattr` were applied after those for `attr`.'
+        if newattr_prec > attr_prec:
+            return (attr & ~2047) | newattr, newattr_prec
+        return attr | (newattr & ~2047), attr_prec
+
 
 colors = ColorMaker()
 
@@ -0,0 +1,22 @@
+from .vdtui import *
+from .lazyrows import *
+
+option('virtual_rows_cache', 10000, 'number of computed rows to keep for virtual sheets (joins, concatenations, melts)')
+
+
+class VirtualRow(list):
+    'Row computed by a VirtualRows, as a list which can be weakly referenced.'
+    __slots__ = ('__weakref__',)
+
+
+class VirtualRows(CachedRows):
+    '''Sequence of rows computed on demand by calcRow(i), so that a sheet can show rows without computing them all.
+       The same row object is returned for an index while it is in the cache or still referenced elsewhere (e.g. selected).
+
+    Any change to the sequence itself (sort, insert, delete) first computes all rows into a list on the sheet.'''
+    def cacheSize(self):
+        return options.virtual_rows_cache
+
+    def calcRow(self, i):
+        'Return new VirtualRow for index `i`.  Override in subclass.'
+        raise IndexError(i)